@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import argparse
+import warnings
+import multiprocessing
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+
+from generate_data import find_dataset
+from matrix_cache import prepared_matrix
+
+
+def walk_forward_folds(n_seasons, min_train_seasons=1):
+    # (last training season, test season) of every fold: train on seasons <= k, test on season k + 1
+    return [(k, k + 1) for k in range(min_train_seasons - 1, n_seasons - 1)]
+
+
+def _pin_threads(threads):
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def fold_data(matrix, fold):
+    # Features and labels of every row up to the fold's last training season and of the next season.
+    # Rows of the matrix are sorted by season, so all four are views of the memory mapped files.
+    last_train, test = fold
+    train_rows = matrix.season_rows(0, last_train)
+    test_rows = matrix.season_rows(test, test)
+
+    return matrix.x[train_rows], matrix.y[train_rows], matrix.x[test_rows], matrix.y[test_rows]
+
+
+def run_fold(data_dir, fold, baseline_column, epochs=100, patience=10):
+    # Train on every row up to the fold's last training season and test on the next season
+    from model import create_model, train_model, test_model
+    from matrix_cache import PreparedMatrix
+
+    start = time.time()
+
+    train_x, train_y, test_x, test_y = fold_data(PreparedMatrix(data_dir), fold)
+
+    model = create_model(train_x)
+    history, model = train_model(model, train_x, train_y, epochs=epochs, patience=patience)
+
+    return {
+        'fold': fold,
+        'train_rows': int(train_x.shape[0]),
+        'test_rows': int(test_x.shape[0]),
+        'epochs': len(history.history['loss']),
+        'mae': float(test_model(model, test_x, test_y)),
+        # Predicting the player's average so far, the model should beat it
+        'baseline_mae': float(np.mean(np.abs(test_x[:, baseline_column] - test_y))),
+        'seconds': time.time() - start
+    }
+
+
+def backtest(dataset, workers=None, min_train_seasons=1, epochs=100, patience=10, min_minutes=23):
+    # Walk-forward backtest of a dataset, folds run in parallel processes sharing one memory mapped matrix
+    matrix = prepared_matrix(dataset, min_minutes)
+    season_names = matrix.season_names
+    folds = walk_forward_folds(len(season_names), min_train_seasons)
+
+    if len(folds) == 0:
+        raise ValueError(f"{dataset} has {len(season_names)} season(s), at least {min_train_seasons + 1} are needed")
+
+    workers = min(workers or os.cpu_count() or 1, len(folds))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    context = multiprocessing.get_context('spawn')
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_pin_threads, initargs=(threads,)) as executor:
+        futures = [executor.submit(run_fold, matrix.directory, fold, matrix.columns.index('PTS_PG'), epochs, patience) for fold in folds]
+        results = [future.result() for future in futures]
+
+    for result in results:
+        last_train, test = result.pop('fold')
+        result['train_seasons'] = f"{season_names[0]}..{season_names[last_train]}"
+        result['test_season'] = season_names[test]
+
+    return results
+
+
+def summary(results):
+    lines = [f"{'train seasons':<20}{'test':>9}{'train rows':>12}{'test rows':>11}{'epochs':>8}{'MAE':>8}{'baseline':>10}{'seconds':>9}"]
+
+    for r in results:
+        lines.append(
+            f"{r['train_seasons']:<20}{r['test_season']:>9}{r['train_rows']:>12}{r['test_rows']:>11}{r['epochs']:>8}"
+            f"{r['mae']:>8.3f}{r['baseline_mae']:>10.3f}{r['seconds']:>9.1f}"
+        )
+
+    mae = np.array([r['mae'] for r in results])
+    lines.append(f"MAE over {len(results)} folds: mean {mae.mean():.3f}, std {mae.std():.3f}, worst {mae.max():.3f}")
+
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Ignore WARNINGs
+    warnings.filterwarnings('ignore')
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+    # Create command line parser
+    parser = argparse.ArgumentParser()
+
+    # Add command line arguments
+    parser.add_argument('--season_type', default='Regular Season', help='Regular Season or Playoffs')
+    parser.add_argument('--workers', type=int, help='Folds trained at once, all cores by default')
+    parser.add_argument('--min-train-seasons', type=int, default=1, help='Seasons in the training set of the first fold')
+    parser.add_argument('--epochs', type=int, default=100, help='Most epochs trained per fold')
+    parser.add_argument('--patience', type=int, default=10, help='Epochs without a better validation MAE before a fold stops')
+    parser.add_argument('--json', help='Save per-fold results to this JSON file')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    season_type = args.season_type.replace(" ", "").lower()
+    results = backtest(find_dataset(f"data/nba_dataset_{season_type}"), args.workers, args.min_train_seasons, args.epochs, args.patience)
+
+    print(summary(results))
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
@@ -0,0 +1,117 @@
+import os
+import sys
+import argparse
+import warnings
+import pandas as pd
+import numpy as np
+
+from generate_data import LeagueTables, assemble_features
+from feature_store import FeatureStore
+from inference import predict_points
+from registry import registry
+
+
+# Columns of a slate, b2b is optional
+slate_columns = ['player', 'team', 'opponent', 'season_type', 'home_game', 'b2b']
+
+
+def read_slate(src):
+    # Slate of games from a CSV file or a JSON list of objects
+    if os.path.splitext(src)[1] == '.json':
+        games = pd.read_json(src, orient='records')
+    else:
+        games = pd.read_csv(src)
+
+    if 'b2b' not in games.columns:
+        games['b2b'] = 0
+
+    return games[slate_columns]
+
+
+def slate_features(games, season_type, tables, store=None, max_age=24 * 60 * 60):
+    # Feature matrix of all games of one season type, rows with unknown players or teams are NaN
+    players = teams = None
+
+    # Feature store is used only when it has fresh features of every player and team on the slate
+    if store is not None:
+        player_names = games['player'].unique()
+        team_names = np.union1d(games['team'].unique(), games['opponent'].unique())
+        player_rows = [store.player(season_type, player, max_age) for player in player_names]
+        team_rows = [store.team(season_type, team, max_age) for team in team_names]
+
+        if all(row is not None for row in player_rows + team_rows):
+            players = pd.DataFrame(player_rows, index=player_names)
+            teams = pd.DataFrame(team_rows, index=team_names)
+
+    if players is None:
+        players, teams = tables.prefetch(season_type).feature_tables(season_type)
+
+    # Playoff datasets, and so playoff models, have no B2B feature
+    b2b = None if season_type == 'Playoffs' else games['b2b'].reset_index(drop=True)
+
+    return assemble_features(
+        players.reindex(games['player']).reset_index(drop=True),
+        teams.reindex(games['team']).reset_index(drop=True),
+        teams.reindex(games['opponent']).reset_index(drop=True),
+        games['home_game'].reset_index(drop=True),
+        b2b
+    )
+
+
+def predict_slate(games, tables=None, store=None):
+    # Yield predictions of every season type in the slate as soon as they are ready,
+    # each season type is one feature matrix and one forward pass of its model
+    if tables is None:
+        tables = LeagueTables()
+
+    # Without a feature store every season type needs its league tables, start fetching all of them
+    if store is None:
+        for season_type in games['season_type'].unique():
+            tables.prefetch(season_type)
+
+    for season_type, group in games.groupby('season_type', sort=False):
+        features = slate_features(group, season_type, tables, store)
+        valid = features.notna().all(axis=1).values
+
+        model = registry.get(season_type)
+
+        pts = np.full(group.shape[0], np.nan)
+        if valid.any():
+            pts[valid] = np.squeeze(np.asarray(predict_points(model, features[valid])), axis=1)
+
+        yield group.assign(predicted_points=pts)
+
+
+def main(src, dst=None):
+    games = read_slate(src)
+    output = open(dst, 'w', newline='') if dst is not None else sys.stdout
+
+    try:
+        header = True
+
+        for predictions in predict_slate(games, store=FeatureStore()):
+            predictions.to_csv(output, index=False, header=header)
+            output.flush()
+            header = False
+    finally:
+        if dst is not None:
+            output.close()
+
+
+if __name__ == "__main__":
+    # Ignore WARNINGs
+    warnings.filterwarnings('ignore')
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+    # Create command line parser
+    parser = argparse.ArgumentParser()
+
+    # Add command line arguments
+    parser.add_argument('slate', help='<Required> CSV or JSON file with columns player, team, opponent, season_type, home_game and optional b2b')
+    parser.add_argument('--output', '-o', help='CSV file for predictions, standard output by default')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    # Run main
+    main(args.slate, args.output)
@@ -0,0 +1,261 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+import get_data
+import instrument
+
+from concurrent.futures import ThreadPoolExecutor
+
+from synthetic_data import SyntheticLeague, season_names
+from generate_data import LeagueTables, concat_seasons, build_dataset, generate_features, generate_pg, generate_w_pct, generate_b2b
+from dataset import prepare_dataset, split_features_and_labels
+from inference import NumpyModel, predict_points
+from registry import registry
+from batch import predict_slate
+
+
+def measure(results, stage, function, *args, repeat=1, memory=True, rows=None):
+    # Best time of repeat calls of function on fresh copies of its DataFrame arguments,
+    # and peak memory allocated during one more call traced by tracemalloc
+    def call():
+        copies = [arg.copy() if isinstance(arg, pd.DataFrame) else arg for arg in args]
+
+        start = time.perf_counter()
+        ret = function(*copies)
+
+        return ret, time.perf_counter() - start
+
+    runs = [call() for _ in range(repeat)]
+    ret = runs[-1][0]
+
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        call()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+
+    results.append({
+        'stage': stage,
+        'seconds': min(seconds for _, seconds in runs),
+        'peak_mb': peak_mb,
+        'rows': rows if rows is not None else (ret.shape[0] if hasattr(ret, 'shape') else None)
+    })
+
+    return ret
+
+
+def download(function, seasons, season_type):
+    # Fetch and parse every season like generate_dataset does
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        return concat_seasons([executor.submit(function, season, season_type) for season in seasons])
+
+
+def random_model(n_features, units=368, seed=0):
+    # Model shaped like model.create_model with random weights
+    rng = np.random.default_rng(seed)
+
+    return NumpyModel(
+        rng.normal(0, 1, n_features),
+        rng.uniform(0.5, 2, n_features),
+        [rng.normal(0, n_features ** -0.5, (n_features, units)), rng.normal(0, units ** -0.5, (units, 1))],
+        [np.zeros(units), np.zeros(1)],
+        ['relu', 'linear']
+    )
+
+
+def benchmark(n_seasons, season_type="Regular Season", last_n_games=5, repeat=1, memory=True, train=False, epochs=1, league=None):
+    # Time every stage from raw responses to predictions on n_seasons synthetic seasons
+    league = league or SyntheticLeague()
+    seasons = season_names(n_seasons)
+    results = []
+
+    # Serve responses from the synthetic league, without the response cache
+    transport, cache = get_data.transport, get_data.cache
+    get_data.transport = league.transport
+    get_data.configure_cache(enabled=False)
+
+    try:
+        # Generate all responses up front, so only fetching and parsing is timed
+        for season in seasons:
+            league.logs(season, season_type)
+
+        player_points = measure(results, "parse player_points", download, get_data.get_player_points, seasons, season_type, repeat=repeat, memory=memory)
+        player_shooting = measure(results, "parse player_shooting", download, get_data.get_player_shooting, seasons, season_type, repeat=repeat, memory=memory)
+        team_opp_shooting = measure(results, "parse team_opp_shooting", download, get_data.get_team_opponent_shooting, seasons, season_type, repeat=repeat, memory=memory)
+        team_results = measure(results, "parse team_results", download, get_data.get_team_results, seasons, season_type, repeat=repeat, memory=memory)
+    finally:
+        get_data.transport, get_data.cache = transport, cache
+
+    # Feature generators, each on the raw game logs
+    measure(results, "generate_b2b", generate_b2b, player_points, repeat=repeat, memory=memory)
+    measure(results, "generate_pg PTS", generate_pg, player_points, "PTS", "PLAYER_NAME", "PLAYER_NAME", last_n_games, repeat=repeat, memory=memory)
+    measure(results, "generate_pg MIN", generate_pg, player_points, "MIN", "PLAYER_NAME", "PLAYER_NAME", 3, repeat=repeat, memory=memory)
+    measure(results, "generate_w_pct", generate_w_pct, team_results, last_n_games, repeat=repeat, memory=memory)
+    measure(results, "generate_pg OFF_RATING", generate_pg, team_results, "OFF_RATING", "TEAM_NAME", "TEAM_NAME", last_n_games, repeat=repeat, memory=memory)
+    measure(results, "generate_pg OPP_DEF_RATING", generate_pg, team_results, "DEF_RATING", "TEAM_NAME", "MATCHUP", last_n_games, "OPP_", repeat=repeat, memory=memory)
+
+    # Whole build, its type casts and merges are timed by their instrument spans
+    was_enabled = instrument.enabled
+    instrument.reset()
+    instrument.enable(instrument.profilers)
+
+    try:
+        df = measure(results, "build_dataset", build_dataset, player_points, player_shooting, team_opp_shooting, team_results, season_type, last_n_games, repeat=repeat, memory=memory)
+        spans = instrument.spans()
+    finally:
+        if not was_enabled:
+            instrument.disable()
+
+    for name in ["set_dtypes", "merge_dataset"]:
+        seconds = [s['duration'] for s in spans if s['name'] == name and s['depth'] == 1]
+        results.append({'stage': f"build_dataset {name}", 'seconds': min(seconds), 'peak_mb': None, 'rows': df.shape[0]})
+
+    # Training data and inference
+    prepared = measure(results, "prepare_dataset", prepare_dataset, df, repeat=repeat, memory=memory)
+    x, y = split_features_and_labels(prepared)
+    x = x.to_numpy(dtype=np.float32)
+
+    model = random_model(x.shape[1])
+    measure(results, "predict_points", predict_points, model, x, repeat=repeat, memory=memory, rows=x.shape[0])
+
+    if train:
+        from model import create_model, train_model
+
+        keras_model = create_model(x)
+        measure(results, f"train_model {epochs} epochs", train_model, keras_model, x, y.to_numpy(dtype=np.float32), 0.2, 0, epochs, repeat=1, memory=False, rows=x.shape[0])
+
+    return {
+        'n_seasons': n_seasons,
+        'season_type': season_type,
+        'player_rows': player_points.shape[0],
+        'team_rows': team_results.shape[0],
+        'dataset_rows': df.shape[0],
+        'stages': results
+    }
+
+
+def slate_benchmark(n_games=500, loop_games=20, latency=0.0, season_type="Regular Season", league=None):
+    # Games per second of batch.predict_slate against predicting the games one by one like main.main does,
+    # each with its own league tables and forward pass. Responses come from the synthetic league after latency
+    # seconds, the loop is timed on its first loop_games games only and compared per game.
+    league = league or SyntheticLeague()
+    player_logs, _ = league.logs(get_data.current_season, season_type)
+
+    # Games of random players against a random other team
+    rng = np.random.default_rng(0)
+    players = player_logs.drop_duplicates('PLAYER_NAME').sample(n_games, replace=True, random_state=0)
+    teams = player_logs['TEAM_NAME'].unique()
+    opponents = [rng.choice(teams[teams != team]) for team in players['TEAM_NAME']]
+
+    games = pd.DataFrame({
+        'player': players['PLAYER_NAME'].values, 'team': players['TEAM_NAME'].values, 'opponent': opponents,
+        'season_type': season_type, 'home_game': rng.integers(0, 2, n_games), 'b2b': rng.integers(0, 2, n_games)
+    })
+
+    def transport(url, params):
+        time.sleep(latency)
+        return league.transport(url, params)
+
+    transport_before, cache, directory = get_data.transport, get_data.cache, registry.directory
+    get_data.transport = transport
+    get_data.configure_cache(enabled=False)
+
+    try:
+        with tempfile.TemporaryDirectory() as models:
+            # Random model of the right shape, both paths load it from the registry once
+            features = generate_features(games['player'][0], games['team'][0], games['opponent'][0], season_type, 1, 0)
+            random_model(features.shape[1]).save(os.path.join(models, f"nba_predictor_{season_type.replace(' ', '').lower()}.npz"))
+            registry.directory = models
+            model = registry.get(season_type)
+
+            start = time.perf_counter()
+            for game in games.head(loop_games).itertuples():
+                features = generate_features(game.player, game.team, game.opponent, season_type, game.home_game, game.b2b)
+                predict_points(model, features)[0][0]
+            loop_seconds = (time.perf_counter() - start) / min(loop_games, n_games)
+
+            start = time.perf_counter()
+            predictions = pd.concat(list(predict_slate(games, LeagueTables())))
+            batch_seconds = (time.perf_counter() - start) / n_games
+    finally:
+        get_data.transport, get_data.cache, registry.directory = transport_before, cache, directory
+
+    return {
+        'games': n_games,
+        'predicted': int(predictions['predicted_points'].notna().sum()),
+        'latency_ms': latency * 1000,
+        'loop_games_per_second': 1 / loop_seconds,
+        'batch_games_per_second': 1 / batch_seconds,
+        'speedup': loop_seconds / batch_seconds
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return maxrss / 1024 ** 2 if sys.platform == "darwin" else maxrss / 1024
+
+
+if __name__ == "__main__":
+    # Create command line parser
+    parser = argparse.ArgumentParser()
+
+    # Add command line arguments
+    parser.add_argument('--seasons', nargs='+', type=int, default=[1, 5], help='Numbers of synthetic seasons to benchmark, 1 to 20')
+    parser.add_argument('--season-type', default='Regular Season', choices=['Regular Season', 'Playoffs'])
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage, the fastest is reported')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the extra tracemalloc run that measures peak memory of every stage')
+    parser.add_argument('--train', action='store_true', help='Also time training the keras model (needs TensorFlow)')
+    parser.add_argument('--epochs', type=int, default=1, help='Epochs trained with --train')
+    parser.add_argument('--slate-games', type=int, default=500, help='Games of the batch prediction benchmark, 0 skips it')
+    parser.add_argument('--latency-ms', type=float, nargs='+', default=[0, 100], help='Simulated stats.nba.com latencies of the batch prediction benchmark')
+    parser.add_argument('--json', help='Save results to this JSON file')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    slates = []
+    if args.slate_games > 0:
+        print(f"{'latency ms':>10}{'games':>8}{'one by one/s':>14}{'batch/s':>10}{'speedup':>9}")
+
+        for latency_ms in args.latency_ms:
+            slate = slate_benchmark(args.slate_games, latency=latency_ms / 1000)
+            slates.append(slate)
+
+            print(f"{latency_ms:>10.0f}{slate['games']:>8}{slate['loop_games_per_second']:>14.1f}{slate['batch_games_per_second']:>10.1f}{slate['speedup']:>8.0f}x")
+
+    runs = []
+    for n_seasons in args.seasons:
+        run = benchmark(n_seasons, args.season_type, repeat=args.repeat, memory=not args.no_memory, train=args.train, epochs=args.epochs)
+        runs.append(run)
+
+        print(f"\n{n_seasons} season(s): {run['player_rows']} player rows, {run['team_rows']} team rows, {run['dataset_rows']} dataset rows")
+        print(f"{'stage':<34}{'seconds':>10}{'peak MB':>10}{'rows':>10}")
+        for result in run['stages']:
+            peak_mb = f"{result['peak_mb']:.1f}" if result['peak_mb'] is not None else "-"
+            print(f"{result['stage']:<34}{result['seconds']:>10.3f}{peak_mb:>10}{result['rows'] or '':>10}")
+
+    print(f"\npeak RSS {peak_rss_mb():.1f} MB")
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump({
+                'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'peak_rss_mb': peak_rss_mb(),
+                'slates': slates,
+                'runs': runs
+            }, f, indent=4)
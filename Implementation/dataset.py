@@ -0,0 +1,48 @@
+import pandas as pd
+import numpy as np
+
+
+def prepare_dataset(df, min_minutes=23):
+    # Clean data
+    df = df.drop(columns=['SEASON_YEAR', 'PLAYER_NAME', 'TEAM_NAME', 'GAME_ID', 'MATCHUP', 'WL'])
+
+    # Only columns read as text (CSV) need to be parsed, columnar datasets are already numeric
+    text_columns = df.select_dtypes(exclude='number').columns
+    if len(text_columns) > 0:
+        df[text_columns] = df[text_columns].apply(pd.to_numeric, errors='coerce')
+
+    # Drop stats with players who played under min_minutes
+    df = df[df['MIN'] > min_minutes]
+
+    # Drop any stil NaN information
+    df.dropna(inplace=True)
+
+    return df
+
+
+def remove_outliers(df, frac=0.45):
+    return df[abs(df['PTS'] - (df['PTS_PG'] + df['LAST_N_PTS_PG']) / 2) < ((df['PTS_PG'] + df['LAST_N_PTS_PG']) * (0.5 * frac))]
+
+
+def split_dataset(df, train_pct=0.8): 
+    # Split training and test data
+    train = df.sample(frac=train_pct, random_state=0)
+    test = df.drop(train.index)
+
+    return train, test
+
+
+def split_rows(n_rows, train_pct=0.8):
+    # Positions of the training and test rows, the same split split_dataset makes of a frame of n_rows rows
+    train = np.random.RandomState(0).choice(n_rows, size=int(round(train_pct * n_rows)), replace=False)
+    test = np.setdiff1d(np.arange(n_rows), train)
+
+    return train, test
+
+
+def split_features_and_labels(df):
+    # Split features and labels
+    df_x = df.drop(columns=['PTS', 'MIN'])
+    df_y = df['PTS']
+
+    return df_x, df_y
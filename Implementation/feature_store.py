@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+
+
+# Feature store used by the app, refreshed with `python feature_store.py` or by
+# generate_data.update_dataset(src, store=FeatureStore()) together with the dataset
+default_store_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "feature_store.sqlite")
+
+
+class FeatureStore:
+    # Player and team feature rows generate_features assembles a prediction from, kept in SQLite and
+    # refreshed by the data pipeline, so predictions are indexed lookups without requests to stats.nba.com.
+    # Every row remembers when it was updated, lookups older than max_age are treated as missing.
+
+    def __init__(self, path=default_store_path):
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS player_features (
+                    season_type TEXT NOT NULL,
+                    player TEXT NOT NULL,
+                    features TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (season_type, player)
+                );
+                CREATE TABLE IF NOT EXISTS team_features (
+                    season_type TEXT NOT NULL,
+                    team TEXT NOT NULL,
+                    features TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (season_type, team)
+                );
+                CREATE TABLE IF NOT EXISTS updates (
+                    season_type TEXT PRIMARY KEY,
+                    season TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                """
+            )
+
+        return self._connection
+
+    def update(self, season_type, season, players, teams):
+        # Replace features of season_type with rows of player_feature_table and team_feature_table
+        now = time.time()
+
+        with self._lock:
+            connection = self._connect()
+
+            with connection:
+                connection.execute("DELETE FROM player_features WHERE season_type = ?", (season_type,))
+                connection.execute("DELETE FROM team_features WHERE season_type = ?", (season_type,))
+                connection.executemany(
+                    "INSERT INTO player_features VALUES (?, ?, ?, ?)",
+                    [(season_type, player, json.dumps(row.astype(float).to_dict()), now) for player, row in players.iterrows()]
+                )
+                connection.executemany(
+                    "INSERT INTO team_features VALUES (?, ?, ?, ?)",
+                    [(season_type, team, json.dumps(row.astype(float).to_dict()), now) for team, row in teams.iterrows()]
+                )
+                connection.execute("INSERT OR REPLACE INTO updates VALUES (?, ?, ?)", (season_type, season, now))
+
+    def _get(self, table, column, season_type, name, max_age):
+        row = self._connect().execute(
+            f"SELECT features, updated_at FROM {table} WHERE season_type = ? AND {column} = ?", (season_type, name)
+        ).fetchone()
+
+        if row is None or (max_age is not None and time.time() - row[1] > max_age):
+            return None
+
+        return json.loads(row[0])
+
+    def player(self, season_type, player, max_age=None):
+        with self._lock:
+            return self._get("player_features", "player", season_type, player, max_age)
+
+    def team(self, season_type, team, max_age=None):
+        with self._lock:
+            return self._get("team_features", "team", season_type, team, max_age)
+
+    def lookup(self, season_type, player, team, opponent, max_age=None):
+        # Features of the player, team and opponent, or None if any of them is missing or stale
+        with self._lock:
+            features = (
+                self._get("player_features", "player", season_type, player, max_age),
+                self._get("team_features", "team", season_type, team, max_age),
+                self._get("team_features", "team", season_type, opponent, max_age)
+            )
+
+        return None if any(f is None for f in features) else features
+
+    def updated_at(self, season_type):
+        # Time of the last update of season_type, None if it was never updated
+        with self._lock:
+            row = self._connect().execute("SELECT updated_at FROM updates WHERE season_type = ?", (season_type,)).fetchone()
+
+        return None if row is None else row[0]
+
+
+if __name__ == "__main__":
+    from generate_data import LeagueTables, update_feature_store
+
+    # Create command line parser
+    parser = argparse.ArgumentParser()
+
+    # Add command line arguments
+    parser.add_argument('--season_type', action='append', help='Regular Season or Playoffs, both by default')
+    parser.add_argument('--path', default=default_store_path, help='Feature store file')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    # Refresh feature store, both season types share the same tables object
+    store = FeatureStore(args.path)
+    tables = LeagueTables()
+
+    for season_type in args.season_type or ['Regular Season', 'Playoffs']:
+        players, teams = update_feature_store(store, season_type, tables)
+        print(f"{season_type}: {players.shape[0]} players, {teams.shape[0]} teams")
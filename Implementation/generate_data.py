@@ -1,117 +1,236 @@
+import os
+import pickle
+import threading
 import pandas as pd
 import numpy as np
 
-from get_data import get_player_points, get_player_shooting, get_team_opponent_shooting, get_team_results, get_team_stats
+from concurrent.futures import ThreadPoolExecutor
+
+from instrument import span, traced
+from get_data import current_season, get_player_points, get_player_shooting, get_team_opponent_shooting, get_team_results, get_team_stats
 from datetime import datetime
 
-current_season = "2021-22"
 
+# Columns identifying seasons, players, teams and games with their types, every other column is numeric
+key_columns = {
+    "SEASON_YEAR": str,
+    "PLAYER_NAME": str,
+    "TEAM_NAME": str,
+    "TEAM_ID": "int64",
+    "GAME_ID": "int64",
+    "MATCHUP": str,
+    "WL": str
+}
 
-def generate_data(num_of_seasons, season_type, function):
-    seasons = ["2020-21", "2019-20", "2018-19", "2017-18", "2016-17", "2015-16", "2014-15", "2013-14", "2012-13", "2011-12", "2010-11"]
+# Key columns stored as categories in columnar datasets
+categorical_columns = ["SEASON_YEAR", "PLAYER_NAME", "TEAM_NAME", "MATCHUP", "WL"]
 
-    if num_of_seasons > len(seasons):
-        num_of_seasons = len(seasons)
+# Completed seasons, most recent first
+seasons = ["2020-21", "2019-20", "2018-19", "2017-18", "2016-17", "2015-16", "2014-15", "2013-14", "2012-13", "2011-12", "2010-11"]
 
-    df = pd.DataFrame()
 
-    for i in range(num_of_seasons):
-        df = df.append(function(seasons[i], season_type), ignore_index=True)
+def submit_seasons(executor, num_of_seasons, season_type, function):
+    # Start downloading the most recent num_of_seasons seasons
+    return [executor.submit(function, season, season_type) for season in seasons[:num_of_seasons]]
 
-    df.fillna(0, inplace=True)
 
-    return df
+def concat_seasons(futures):
+    if len(futures) == 0:
+        return pd.DataFrame()
 
+    frames = [future.result() for future in futures]
+    df = pd.concat(frames, ignore_index=True)
 
-def generate_pg(df, column, group_by, filter_by, last_n_games=5, opp=""):
-    def filter(row):
-        df_mod = df[(df[group_by] == row[filter_by]) & (df['GAME_DATE'] < row['GAME_DATE'])]
-        return df_mod[column].mean() if df_mod.shape[0] > 0 else row[column]
+    # Seasons have different categories, so categorical columns are concatenated as objects and categorized again
+    for column in frames[0].select_dtypes("category").columns:
+        df[column] = df[column].astype("category")
 
-    def filter_last_n(row):
-        df_mod = df[(df[group_by] == row[filter_by]) & (df['GAME_DATE'] < row['GAME_DATE'])]
-        df_mod.sort_values('GAME_DATE', inplace=True, ascending = False)
-        df_mod = df_mod.head(last_n_games)
-        return df_mod[column].mean() if df_mod.shape[0] > 0 else row[column]
-    
+    # Missing numbers are zeros
+    numeric = df.select_dtypes("number").columns
+    df[numeric] = df[numeric].fillna(0)
+
+    return df
+
+
+def generate_data(num_of_seasons, season_type, function, max_workers=4):
+    # Download up to max_workers seasons at once
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return concat_seasons(submit_seasons(executor, num_of_seasons, season_type, function))
+
+
+def _prior_means(df, values, group_by, filter_by, last_n_games, state=None):
+    # Mean of values over every earlier game of a group and over its last n games, looked up for each row.
+    # Games are sorted once per group, running totals are taken per (group, date) and each row is matched
+    # with the last date strictly before its own, so games played on the same date are never counted.
+    # state holds running totals of games seen before df: for every group the sum and count of its values
+    # before its last n games ('base') and those last n games themselves ('tail'). Updated state is returned.
+    hist = pd.DataFrame({
+        '_KEY': df[group_by].astype(object).values,
+        'GAME_DATE': df['GAME_DATE'].values,
+        '_VALUE': values.values
+    })
+
+    if state is not None:
+        hist = pd.concat([state['tail'], hist], ignore_index=True)
+
+    hist.sort_values(['_KEY', 'GAME_DATE'], inplace=True, kind='mergesort')
+
+    # Totals of games before the last n games stay in base, the rest becomes the new tail
+    tail = hist.groupby('_KEY', sort=False).tail(last_n_games)
+    base = hist.drop(tail.index).groupby('_KEY')['_VALUE'].agg(['sum', 'count'])
+    if state is not None:
+        base = base.add(state['base'], fill_value=0)
+
+    hist['_SUM'] = hist['_VALUE'].fillna(0)
+    hist['_CNT'] = hist['_VALUE'].notna().astype(int)
+
+    grouped = hist.groupby('_KEY', sort=False)
+    hist['_SUM'] = grouped['_SUM'].cumsum()
+    hist['_CNT'] = grouped['_CNT'].cumsum()
+
+    # Totals of the last n games are running totals minus the running totals n games earlier
+    grouped = hist.groupby('_KEY', sort=False)
+    hist['_LAST_SUM'] = hist['_SUM'] - grouped['_SUM'].shift(last_n_games, fill_value=0)
+    hist['_LAST_CNT'] = hist['_CNT'] - grouped['_CNT'].shift(last_n_games, fill_value=0)
+
+    # Running totals continue from the games before the stored tail
+    if state is not None:
+        hist['_SUM'] += hist['_KEY'].map(state['base']['sum']).fillna(0).values
+        hist['_CNT'] += hist['_KEY'].map(state['base']['count']).fillna(0).values
+
+    # Keep totals up to and including each date of a group
+    hist.drop_duplicates(['_KEY', 'GAME_DATE'], keep='last', inplace=True)
+    hist['_PG'] = hist['_SUM'] / hist['_CNT'].where(hist['_CNT'] > 0)
+    hist['_LAST_PG'] = hist['_LAST_SUM'] / hist['_LAST_CNT'].where(hist['_LAST_CNT'] > 0)
+    hist['_FOUND'] = True
+    hist = hist[['_KEY', 'GAME_DATE', '_PG', '_LAST_PG', '_FOUND']].sort_values('GAME_DATE', kind='mergesort')
+
+    # Join every row with the history of the group it refers to (its own or e.g. its opponent's)
+    rows = pd.DataFrame({
+        '_KEY': df[filter_by].astype(object).values,
+        'GAME_DATE': df['GAME_DATE'].values,
+        '_ROW': np.arange(df.shape[0])
+    })
+    rows.sort_values('GAME_DATE', inplace=True, kind='mergesort')
+    rows = pd.merge_asof(rows, hist, on='GAME_DATE', by='_KEY', allow_exact_matches=False)
+    rows.sort_values('_ROW', inplace=True)
+
+    found = rows['_FOUND'].fillna(False).astype(bool).values
+    state = {'base': base, 'tail': tail.reset_index(drop=True)}
+
+    return rows['_PG'].values, rows['_LAST_PG'].values, found, state
+
+
+@traced
+def generate_pg(df, column, group_by, filter_by, last_n_games=5, opp="", states=None):
+    # states, if given, is a dict of running state per generated column, read and updated in place
     column1 = f"{opp}{column}_PG"
     column2 = f"{opp}LAST_{last_n_games}_{column}_PG"
 
     df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'])
     df[column] = pd.to_numeric(df[column])
-    df[column1] = df.apply(filter, axis=1)
-    df[column2] = df.apply(filter_last_n, axis=1)
-    
-    return df
-
 
-def generate_w_pct(df, last_n_games=5, opp=""):
-    def filter(row):
-        df_mod = df[(df["TEAM_NAME"] == row["TEAM_NAME"]) & (df['GAME_DATE'] < row['GAME_DATE'])]
-        df_win = df_mod[df_mod['WL'] == 'W']
+    # Fall back to the row's own value when there is no earlier game
+    state = states.get(column1) if states is not None else None
+    pg, last_n_pg, found, state = _prior_means(df, df[column], group_by, filter_by, last_n_games, state)
+    df[column1] = np.where(found, pg, df[column].values)
+    df[column2] = np.where(found, last_n_pg, df[column].values)
 
-        return df_win.shape[0] / df_mod.shape[0] if df_mod.shape[0] > 0 else 0.5
+    if states is not None:
+        states[column1] = state
+    
+    return df
 
-    def filter_last_n(row):
-        df_mod = df[(df["TEAM_NAME"] == row["TEAM_NAME"]) & (df['GAME_DATE'] < row['GAME_DATE'])]
-        df_mod.sort_values('GAME_DATE', inplace=True, ascending = False)
-        df_mod = df_mod.head(last_n_games)
-        df_win = df_mod[df_mod['WL'] == 'W']
 
-        return df_win.shape[0] / df_mod.shape[0] if df_mod.shape[0] > 0 else 0.5
-    
+@traced
+def generate_w_pct(df, last_n_games=5, opp="", states=None):
     column1 = opp + "W_PCT"
     column2 = opp + "LAST_N_W_PCT"
 
     df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'])
-    df[column1] = df.apply(filter, axis=1)
-    df[column2] = df.apply(filter_last_n, axis=1)
+
+    # Share of earlier games won, 0.5 when there is no earlier game
+    wins = (df['WL'] == 'W').astype(float)
+    state = states.get(column1) if states is not None else None
+    w_pct, last_n_w_pct, found, state = _prior_means(df, wins, "TEAM_NAME", "TEAM_NAME", last_n_games, state)
+    df[column1] = np.where(found, w_pct, 0.5)
+    df[column2] = np.where(found, last_n_w_pct, 0.5)
+
+    if states is not None:
+        states[column1] = state
 
     return df
 
 
-def generate_b2b(df):
-    def filter(row):
-        df_mod = df[(df['PLAYER_NAME'] == row["PLAYER_NAME"]) & (df['GAME_DATE'] < row['GAME_DATE'])]
+@traced
+def generate_b2b(df, states=None):
+    df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'])
 
-        if df_mod.shape[0] == 0:
-            return 0
+    # Days between each date a player played and the previous one, the running state is each player's last date
+    dates = df[['PLAYER_NAME', 'GAME_DATE']].astype({'PLAYER_NAME': object}).drop_duplicates()
+    if states is not None and 'B2B' in states:
+        dates = pd.concat([states['B2B'], dates], ignore_index=True).drop_duplicates()
 
-        last_game = df_mod['GAME_DATE'].max()
-        diff = row['GAME_DATE'] - last_game
+    dates.sort_values(['PLAYER_NAME', 'GAME_DATE'], inplace=True, kind='mergesort')
+    dates['B2B'] = (dates.groupby('PLAYER_NAME', sort=False)['GAME_DATE'].diff().dt.days == 1).astype(int)
 
-        # If games are 2 days in a row
-        return 1 if diff.days == 1 else 0
+    # If games are 2 days in a row
+    rows = df[['PLAYER_NAME', 'GAME_DATE']].astype({'PLAYER_NAME': object})
+    df['B2B'] = rows.merge(dates, how='left', on=['PLAYER_NAME', 'GAME_DATE'])['B2B'].values
 
-    df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'])
-    df['B2B'] = df.apply(filter, axis=1)
+    if states is not None:
+        states['B2B'] = dates.groupby('PLAYER_NAME', as_index=False)['GAME_DATE'].max()
     
     return df
 
 
-def generate_dataset(n_seasons=4, season_type="Regular Season", last_n_games=5, dst=None):
-    # Generate player points data
-    player_points = generate_data(n_seasons, season_type, get_player_points)
-    player_points = generate_b2b(player_points)
-    player_points = generate_pg(player_points, "PTS", "PLAYER_NAME", "PLAYER_NAME", last_n_games)
-    player_points = generate_pg(player_points, "MIN", "PLAYER_NAME", "PLAYER_NAME", 3)
+@traced
+def generate_dataset(n_seasons=4, season_type="Regular Season", last_n_games=5, dst=None, max_workers=4):
+    # Download every season of every endpoint, at most max_workers requests at once
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        player_points = submit_seasons(executor, n_seasons, season_type, get_player_points)
+        player_shooting = submit_seasons(executor, n_seasons, season_type, get_player_shooting)
+        team_opp_shooting = submit_seasons(executor, n_seasons, season_type, get_team_opponent_shooting)
+        team_results = submit_seasons(executor, n_seasons, season_type, get_team_results)
+
+        player_points = concat_seasons(player_points)
+        player_shooting = concat_seasons(player_shooting)
+        team_opp_shooting = concat_seasons(team_opp_shooting)
+        team_results = concat_seasons(team_results)
 
-    # Generate player shooting FGA data
-    player_shooting = generate_data(n_seasons, season_type, get_player_shooting)
+    # Running state of every feature, so the dataset can later be extended with update_dataset
+    states = {}
+    df = build_dataset(player_points, player_shooting, team_opp_shooting, team_results, season_type, last_n_games, states)
 
-    # Generate team opponent shooting
-    team_opp_shooting = generate_data(n_seasons, season_type, get_team_opponent_shooting)
+    if dst is not None:
+        save_dataset(df, dst)
+        save_state(states, dst, season_type, last_n_games)
+
+    return df
+
+
+@traced
+def build_dataset(player_points, player_shooting, team_opp_shooting, team_results, season_type, last_n_games=5, states=None):
+    # Game logs newer than the last build are enough when states from that build are given
+    last_game_date = max(pd.to_datetime(player_points['GAME_DATE']).max(), pd.to_datetime(team_results['GAME_DATE']).max())
+
+    # Generate player points data
+    player_points = generate_b2b(player_points, states)
+    player_points = generate_pg(player_points, "PTS", "PLAYER_NAME", "PLAYER_NAME", last_n_games, states=states)
+    player_points = generate_pg(player_points, "MIN", "PLAYER_NAME", "PLAYER_NAME", 3, states=states)
 
     # Generate team results
-    team_results =  generate_data(n_seasons, season_type, get_team_results)
-    team_results = generate_w_pct(team_results, last_n_games)
-    team_results = generate_pg(team_results, "OFF_RATING", "TEAM_NAME", "TEAM_NAME", last_n_games)
-    team_results = generate_pg(team_results, "PACE", "TEAM_NAME", "TEAM_NAME", last_n_games)
+    team_results = generate_w_pct(team_results, last_n_games, states=states)
+    team_results = generate_pg(team_results, "OFF_RATING", "TEAM_NAME", "TEAM_NAME", last_n_games, states=states)
+    team_results = generate_pg(team_results, "PACE", "TEAM_NAME", "TEAM_NAME", last_n_games, states=states)
 
     # Add opponent team results
-    team_results = generate_w_pct(team_results, last_n_games, "OPP_")
-    team_results = generate_pg(team_results, "DEF_RATING", "TEAM_NAME", "MATCHUP", last_n_games, "OPP_")
-    team_results = generate_pg(team_results, "PACE", "TEAM_NAME", "MATCHUP", last_n_games, "OPP_")
+    team_results = generate_w_pct(team_results, last_n_games, "OPP_", states)
+    team_results = generate_pg(team_results, "DEF_RATING", "TEAM_NAME", "MATCHUP", last_n_games, "OPP_", states)
+    team_results = generate_pg(team_results, "PACE", "TEAM_NAME", "MATCHUP", last_n_games, "OPP_", states)
+
+    if states is not None:
+        states['LAST_GAME_DATE'] = last_game_date
 
     # Clean data
     player_points.drop(columns=["GAME_DATE"], inplace=True)
@@ -119,91 +238,388 @@ def generate_dataset(n_seasons=4, season_type="Regular Season", last_n_games=5,
     team_opp_shooting.drop(columns=["TEAM_ID"], inplace=True)
     team_results.drop(columns=["OFF_RATING", "PACE"], inplace=True)
 
-    # Convert all cells to str, so dfs can be merged
-    player_points = player_points.astype(str)
-    player_shooting = player_shooting.astype(str)
-    team_opp_shooting = team_opp_shooting.astype(str)
-    team_results = team_results.astype(str)
+    # Give keys the same types in every df, so dfs can be merged
+    with span("set_dtypes"):
+        player_points = set_dtypes(player_points)
+        player_shooting = set_dtypes(player_shooting)
+        team_opp_shooting = set_dtypes(team_opp_shooting)
+        team_results = set_dtypes(team_results)
 
     # Merge data
-    df = player_points.merge(team_results, on=["SEASON_YEAR", "TEAM_NAME", "GAME_ID", "MATCHUP", "WL"])
-    df = df.merge(player_shooting, how="left", on=["PLAYER_NAME", 'TEAM_ID', "SEASON_YEAR"])
-    df = df.merge(team_opp_shooting, how="left", left_on=["MATCHUP", "SEASON_YEAR"], right_on=["TEAM_NAME", "SEASON_YEAR"])
+    with span("merge_dataset") as attributes:
+        df = player_points.merge(team_results, on=["SEASON_YEAR", "TEAM_NAME", "GAME_ID", "MATCHUP", "WL"])
+        df = df.merge(player_shooting, how="left", on=["PLAYER_NAME", 'TEAM_ID', "SEASON_YEAR"])
+        df = df.merge(team_opp_shooting, how="left", left_on=["MATCHUP", "SEASON_YEAR"], right_on=["TEAM_NAME", "SEASON_YEAR"])
+        attributes['rows'] = df.shape[0]
     df.drop(columns=["TEAM_NAME_y", "TEAM_ID", "35-39 ft. FGA", "40+ ft. FGA", "35-39 ft. OPP_FG_PCT", "40+ ft. OPP_FG_PCT"], inplace=True)
     df.rename(columns={"TEAM_NAME_x": "TEAM_NAME"}, inplace=True)
 
     if season_type == "Playoffs":
         df.drop(columns=["B2B"], inplace=True)
 
-    if dst is not None:
+    return set_categories(df)
+
+
+@traced
+def update_dataset(src, season=current_season, max_workers=4, store=None):
+    # Append games played since the dataset in src was built, features of new games are computed
+    # from the running state saved with the dataset instead of from the whole history.
+    # store, a FeatureStore, is then refreshed with the season's features too, new games or not.
+    df = append_new_games(src, season, max_workers)
+
+    if store is not None:
+        update_feature_store(store, load_state(src)['SEASON_TYPE'], LeagueTables(season))
+
+    return df
+
+
+def append_new_games(src, season=current_season, max_workers=4):
+    # Dataset in src with the games played since it was built, saved together with the new running state
+    states = load_state(src)
+    season_type = states['SEASON_TYPE']
+    last_n_games = states['LAST_N_GAMES']
+
+    # Only games after the last game in the dataset are requested
+    date_from = (states['LAST_GAME_DATE'] + pd.Timedelta(days=1)).strftime("%m/%d/%Y")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        player_points = executor.submit(get_player_points, season, season_type, None, 0, date_from)
+        team_results = executor.submit(get_team_results, season, season_type, None, 0, date_from)
+        player_shooting = executor.submit(get_player_shooting, season, season_type)
+        team_opp_shooting = executor.submit(get_team_opponent_shooting, season, season_type)
+
+        player_points = concat_seasons([player_points])
+        player_shooting = concat_seasons([player_shooting])
+        team_opp_shooting = concat_seasons([team_opp_shooting])
+        team_results = concat_seasons([team_results])
+
+    df = get_dataset(src)
+
+    # Nothing new since the last build
+    if player_points.shape[0] == 0 or team_results.shape[0] == 0:
+        return df
+
+    player_points = player_points[pd.to_datetime(player_points['GAME_DATE']) > states['LAST_GAME_DATE']].copy()
+    team_results = team_results[pd.to_datetime(team_results['GAME_DATE']) > states['LAST_GAME_DATE']].copy()
+
+    if player_points.shape[0] == 0 or team_results.shape[0] == 0:
+        return df
+
+    new = build_dataset(player_points, player_shooting, team_opp_shooting, team_results, season_type, last_n_games, states)
+
+    df = set_categories(pd.concat([set_dtypes(df), set_dtypes(new)], ignore_index=True))
+
+    save_dataset(df, src)
+    save_state(states, src, season_type, last_n_games)
+
+    return df
+
+
+def state_path(dataset):
+    return dataset + ".state.pkl"
+
+
+def save_state(states, dataset, season_type, last_n_games):
+    states['SEASON_TYPE'] = season_type
+    states['LAST_N_GAMES'] = last_n_games
+
+    with open(state_path(dataset), "wb") as f:
+        pickle.dump(states, f)
+
+
+def load_state(dataset):
+    with open(state_path(dataset), "rb") as f:
+        return pickle.load(f)
+
+
+def set_dtypes(df):
+    # Key columns get their own types, everything else is parsed as a number
+    for column in df.columns:
+        if column in key_columns:
+            df[column] = df[column].astype(key_columns[column])
+        else:
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+
+    return df
+
+
+def set_categories(df):
+    for column in categorical_columns:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+
+    return df
+
+
+def find_dataset(name):
+    # Path of a dataset saved under name, columnar formats are preferred over CSV
+    for extension in [".parquet", ".feather", ".arrow", ".csv"]:
+        if os.path.exists(name + extension):
+            return name + extension
+
+    return name + ".csv"
+
+
+def save_dataset(df, dst):
+    # Format is chosen by extension: .parquet, .feather/.arrow (Arrow IPC) or CSV
+    extension = os.path.splitext(dst)[1]
+
+    if extension == ".parquet":
+        df.to_parquet(dst, index=False)
+    elif extension in [".feather", ".arrow"]:
+        # Uncompressed, so it can be memory mapped when read
+        df.reset_index(drop=True).to_feather(dst, compression="uncompressed")
+    else:
         df.to_csv(dst, index=False)
 
+
+def convert_dataset(src, dst):
+    # Save a dataset in a different format, e.g. an existing CSV as Parquet
+    df = set_categories(set_dtypes(get_dataset(src)))
+    save_dataset(df, dst)
+
     return df
 
 
 def get_dataset(src):
+    extension = os.path.splitext(src)[1]
+
+    # Columnar datasets are memory mapped and keep their types
+    if extension == ".parquet":
+        return pd.read_parquet(src, memory_map=True)
+
+    if extension in [".feather", ".arrow"]:
+        from pyarrow import feather
+        return feather.read_table(src, memory_map=True).to_pandas()
+
     return pd.read_csv(src, dtype=str)
 
 
-def generate_features(player, team, opponent, season_type, home_game, b2b=None):
-    # Return value
-    ret = pd.DataFrame()
-    
-    # Player points
-    player_points = get_player_points(current_season, season_type, player)
-    last_n_player_points = player_points.head(5)
-
-    # Team stats
-    team_stats = get_team_stats(current_season, season_type, team)
-    last_n_team_stats = get_team_stats(current_season, season_type, team, 5)
-
-    # Opponent stats
-    opp_stats = get_team_stats(current_season, season_type, opponent)
-    last_n_opp_stats = get_team_stats(current_season, season_type, opponent, 5)
-
-    # Player shooting
-    player_shooting = get_player_shooting(current_season, season_type, player)
-    player_shooting.drop(columns=['SEASON_YEAR', 'TEAM_ID', '35-39 ft. FGA', '40+ ft. FGA'], inplace=True)
-
-    # Team opponent shooting
-    opponent_shooting = get_team_opponent_shooting(current_season, season_type, opponent)
-    opponent_shooting.drop(columns=['SEASON_YEAR', 'TEAM_ID', '35-39 ft. OPP_FG_PCT', '40+ ft. OPP_FG_PCT'], inplace=True)
-
-    # Conversions
-    player_points['PTS'] = pd.to_numeric(player_points['PTS'])
-    last_n_player_points['PTS'] = pd.to_numeric(last_n_player_points['PTS'])
-    player_points['MIN'] = pd.to_numeric(player_points['MIN'])
-    last_n_player_points['MIN'] = pd.to_numeric(last_n_player_points['MIN'])
-
-    if b2b is not None: 
-        ret.at[0, 'B2B'] = b2b
-
-    ret.at[0, 'H/A'] = home_game
-    ret.at[0, 'PTS_PG'] = player_points['PTS'].mean()
-    ret.at[0, 'LAST_N_PTS_PG'] = last_n_player_points['PTS'].mean() 
-    ret.at[0, 'MIN_PG'] = player_points['MIN'].mean()
-    ret.at[0, 'LAST_N_MIN_PG'] = last_n_player_points['MIN'].mean()
-    ret.at[0, 'W_PCT'] = team_stats['W_PCT'].iloc[0]
-    ret.at[0, 'LAST_N_W_PCT'] = last_n_team_stats['W_PCT'].iloc[0]
-    ret.at[0, 'OFF_RATING_PG'] = team_stats['OFF_RATING'].iloc[0]
-    ret.at[0, 'LAST_N_OFF_RATING_PG'] = last_n_team_stats['OFF_RATING'].iloc[0]
-    ret.at[0, 'PACE_PG'] = team_stats['PACE'].iloc[0]
-    ret.at[0, 'LAST_N_PACE_PG'] = last_n_team_stats['PACE'].iloc[0]
-    ret.at[0, 'OPP_W_PCT'] = opp_stats['W_PCT'].iloc[0]
-    ret.at[0, 'OPP_LAST_N_W_PCT'] = last_n_opp_stats['W_PCT'].iloc[0]
-    ret.at[0, 'OPP_DEF_RATING_PG'] = opp_stats['DEF_RATING'].iloc[0]
-    ret.at[0, 'OPP_LAST_N_DEF_RATING_PG'] = last_n_opp_stats['DEF_RATING'].iloc[0]
-    ret.at[0, 'OPP_PACE_PG'] = opp_stats['PACE'].iloc[0]
-    ret.at[0, 'OPP_LAST_N_PACE_PG'] = last_n_opp_stats['PACE'].iloc[0]
+def get_dataset_chunks(src, chunk_size=65536):
+    # Dataset read about chunk_size rows at a time, so it never has to fit into memory at once
+    extension = os.path.splitext(src)[1]
+
+    if extension == ".parquet":
+        from pyarrow import parquet
+        for batch in parquet.ParquetFile(src, memory_map=True).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+
+    elif extension in [".feather", ".arrow"]:
+        # Arrow IPC files are read in the record batches they were written with
+        from pyarrow import ipc, memory_map
+        reader = ipc.open_file(memory_map(src))
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i).to_pandas()
+
+    else:
+        yield from pd.read_csv(src, dtype=str, chunksize=chunk_size)
+
+
+# Threads shared by every LeagueTables, enough to fetch all tables of a prediction at once
+_league_executor = ThreadPoolExecutor(max_workers=5)
+
+
+class LeagueTables:
+    # League-wide tables of a season used to generate features. Each distinct table is requested once,
+    # in the background, and then filtered locally for any player or team, so team and opponent lookups
+    # of one prediction, or a whole batch of predictions, share the same responses.
+
+    def __init__(self, season=current_season):
+        self.season = season
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._feature_tables = {}
+        self._feature_tables_lock = threading.Lock()
+
+    def _table(self, function, season_type, last_n_games=0):
+        key = (function.__name__, season_type, last_n_games)
+
+        with self._lock:
+            future = self._futures.get(key)
+
+            # A request that failed is not reused, the table is requested again
+            if future is None or (future.done() and future.exception() is not None):
+                future = self._futures[key] = _league_executor.submit(function, self.season, season_type, None, last_n_games)
+
+        return future
+
+    def prefetch(self, season_type):
+        # Start fetching every table generate_features needs
+        self._table(get_player_points, season_type)
+        self._table(get_team_stats, season_type)
+        self._table(get_team_stats, season_type, 5)
+        self._table(get_player_shooting, season_type)
+        self._table(get_team_opponent_shooting, season_type)
+
+        return self
+
+    def feature_tables(self, season_type):
+        # Player and team feature tables of the whole league, computed once per season type.
+        # Only tables computed from successful requests are kept, a failed request is retried on the next call.
+        with self._feature_tables_lock:
+            if season_type not in self._feature_tables:
+                players = player_feature_table(self._table(get_player_points, season_type).result(), self._table(get_player_shooting, season_type).result())
+                teams = team_feature_table(
+                    self._table(get_team_stats, season_type).result(),
+                    self._table(get_team_stats, season_type, 5).result(),
+                    self._table(get_team_opponent_shooting, season_type).result()
+                )
+
+                self._feature_tables[season_type] = (players, teams)
+
+        return self._feature_tables[season_type]
+
+    def player_points(self, season_type, player):
+        df = self._table(get_player_points, season_type).result()
+        return df[df["PLAYER_NAME"] == player].copy()
+
+    def team_stats(self, season_type, team, last_n_games=0):
+        df = self._table(get_team_stats, season_type, last_n_games).result()
+        return df[df["TEAM_NAME"] == team].copy()
+
+    def player_shooting(self, season_type, player):
+        df = self._table(get_player_shooting, season_type).result()
+        return df[df["PLAYER_NAME"] == player].copy()
+
+    def team_opponent_shooting(self, season_type, team):
+        df = self._table(get_team_opponent_shooting, season_type).result()
+        return df[df["TEAM_NAME"] == team].copy()
+
+
+@traced
+def player_feature_table(player_points, player_shooting):
+    # Player features of every player in the given tables, indexed by PLAYER_NAME
+    points = pd.DataFrame({
+        'PLAYER_NAME': player_points['PLAYER_NAME'].astype(object).values,
+        'PTS': pd.to_numeric(player_points['PTS']).values,
+        'MIN': pd.to_numeric(player_points['MIN']).values
+    })
+
+    # Game logs are ordered from the most recent game
+    last_n_points = points.groupby('PLAYER_NAME', sort=False).head(5)
+
+    ret = pd.DataFrame({
+        'PTS_PG': points.groupby('PLAYER_NAME')['PTS'].mean(),
+        'LAST_N_PTS_PG': last_n_points.groupby('PLAYER_NAME')['PTS'].mean(),
+        'MIN_PG': points.groupby('PLAYER_NAME')['MIN'].mean(),
+        'LAST_N_MIN_PG': last_n_points.groupby('PLAYER_NAME')['MIN'].mean()
+    })
+
+    # Append player shooting
+    shooting = _first_by(player_shooting.drop(columns=['SEASON_YEAR', 'TEAM_ID', '35-39 ft. FGA', '40+ ft. FGA']), 'PLAYER_NAME')
+
+    return ret.reindex(shooting.index).join(shooting)
+
+
+@traced
+def team_feature_table(team_stats, last_n_team_stats, opponent_shooting):
+    # Team features of every team in the given tables, indexed by TEAM_NAME, used both for a team and its opponent
+    stats = _first_by(team_stats[['TEAM_NAME', 'W_PCT', 'OFF_RATING', 'DEF_RATING', 'PACE']], 'TEAM_NAME')
+    last_n_stats = _first_by(last_n_team_stats[['TEAM_NAME', 'W_PCT', 'OFF_RATING', 'DEF_RATING', 'PACE']], 'TEAM_NAME')
+
+    ret = pd.DataFrame({
+        'W_PCT': stats['W_PCT'],
+        'LAST_N_W_PCT': last_n_stats['W_PCT'],
+        'OFF_RATING_PG': stats['OFF_RATING'],
+        'LAST_N_OFF_RATING_PG': last_n_stats['OFF_RATING'],
+        'PACE_PG': stats['PACE'],
+        'LAST_N_PACE_PG': last_n_stats['PACE'],
+        'DEF_RATING_PG': stats['DEF_RATING'],
+        'LAST_N_DEF_RATING_PG': last_n_stats['DEF_RATING']
+    }, index=stats.index)
+
+    # Append team opponent shooting
+    shooting = _first_by(opponent_shooting.drop(columns=['SEASON_YEAR', 'TEAM_ID', '35-39 ft. OPP_FG_PCT', '40+ ft. OPP_FG_PCT']), 'TEAM_NAME')
+
+    return ret.join(shooting)
+
+
+def _first_by(df, column):
+    # First row of every value of column, with column as index and the rest parsed as numbers
+    df = df.drop_duplicates(column)
+    df.index = df[column].astype(object).values
+
+    return df.drop(columns=[column]).apply(pd.to_numeric, errors='coerce')
+
+
+@traced
+def assemble_features(player_features, team_features, opp_features, home_game, b2b=None):
+    # Model input of one game from rows of player_feature_table and team_feature_table (or the feature store),
+    # or of many games from frames of such rows with the same index as home_game and b2b
+    ret = {}
+
+    if b2b is not None:
+        ret['B2B'] = b2b
+
+    ret['H/A'] = home_game
+    ret['PTS_PG'] = player_features['PTS_PG']
+    ret['LAST_N_PTS_PG'] = player_features['LAST_N_PTS_PG']
+    ret['MIN_PG'] = player_features['MIN_PG']
+    ret['LAST_N_MIN_PG'] = player_features['LAST_N_MIN_PG']
+    ret['W_PCT'] = team_features['W_PCT']
+    ret['LAST_N_W_PCT'] = team_features['LAST_N_W_PCT']
+    ret['OFF_RATING_PG'] = team_features['OFF_RATING_PG']
+    ret['LAST_N_OFF_RATING_PG'] = team_features['LAST_N_OFF_RATING_PG']
+    ret['PACE_PG'] = team_features['PACE_PG']
+    ret['LAST_N_PACE_PG'] = team_features['LAST_N_PACE_PG']
+    ret['OPP_W_PCT'] = opp_features['W_PCT']
+    ret['OPP_LAST_N_W_PCT'] = opp_features['LAST_N_W_PCT']
+    ret['OPP_DEF_RATING_PG'] = opp_features['DEF_RATING_PG']
+    ret['OPP_LAST_N_DEF_RATING_PG'] = opp_features['LAST_N_DEF_RATING_PG']
+    ret['OPP_PACE_PG'] = opp_features['PACE_PG']
+    ret['OPP_LAST_N_PACE_PG'] = opp_features['LAST_N_PACE_PG']
 
     # Append player and team opponent shooting
-    ret.at[0, 'PLAYER_NAME'] = player
-    ret.at[0, 'TEAM_NAME'] = opponent
+    for column in player_features.keys():
+        if column.endswith(' FGA'):
+            ret[column] = player_features[column]
 
-    ret = ret.merge(player_shooting)
-    ret = ret.merge(opponent_shooting)
+    for column in opp_features.keys():
+        if column.endswith(' OPP_FG_PCT'):
+            ret[column] = opp_features[column]
 
-    ret.drop(columns=['PLAYER_NAME', 'TEAM_NAME'], inplace=True)
+    # One game from single rows, or many games from aligned frames
+    ret = pd.DataFrame([ret]) if np.ndim(home_game) == 0 else pd.DataFrame(ret)
     ret[ret.columns] = ret[ret.columns].apply(pd.to_numeric, errors='coerce')
 
     return ret
+
+
+@traced
+def generate_features(player, team, opponent, season_type, home_game, b2b=None, tables=None, store=None, max_age=24 * 60 * 60):
+    # Features come from the feature store when it has fresh entries for the player and both teams,
+    # otherwise they are generated from live league tables
+    if store is not None:
+        features = store.lookup(season_type, player, team, opponent, max_age)
+
+        if features is not None:
+            return assemble_features(*features, home_game, b2b)
+
+    # League tables, pass the same tables to share them between predictions
+    if tables is None:
+        tables = LeagueTables()
+
+    tables.prefetch(season_type)
+
+    # Player points and shooting
+    players = player_feature_table(tables.player_points(season_type, player), tables.player_shooting(season_type, player))
+
+    # Team and opponent stats and team opponent shooting
+    teams = team_feature_table(
+        pd.concat([tables.team_stats(season_type, team), tables.team_stats(season_type, opponent)]),
+        pd.concat([tables.team_stats(season_type, team, 5), tables.team_stats(season_type, opponent, 5)]),
+        tables.team_opponent_shooting(season_type, opponent)
+    )
+
+    return assemble_features(players.loc[player], teams.loc[team], teams.loc[opponent], home_game, b2b)
+
+
+def update_feature_store(store, season_type, tables=None):
+    # Recompute features of every player and team of the current season and save them in the feature store
+    if tables is None:
+        tables = LeagueTables()
+
+    players, teams = tables.prefetch(season_type).feature_tables(season_type)
+    store.update(season_type, tables.season, players, teams)
+
+    return players, teams
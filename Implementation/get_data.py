@@ -1,7 +1,16 @@
-from typing import DefaultDict
-import requests
+import os
+import json
 import pandas as pd
-import numpy as np
+
+from response_cache import ResponseCache
+from http_client import HTTPClient, RateLimiter
+from instrument import span
+from json_rows import read_rows
+from replay import FixtureStore, default_fixture_dir, recording_transport, replay_transport, server_transport
+
+
+# Season that is still being played, its responses are cached only for a limited time
+current_season = "2021-22"
 
 
 # Teams abbreviations
@@ -39,6 +48,10 @@ abbreviations = {
     "WAS":	"Washington Wizards"
 }
 
+# Columns parsed as integers and as categories, GAME_DATE is parsed as a date and every other column as a number
+integer_columns = ["GAME_ID", "TEAM_ID"]
+category_columns = ["SEASON_YEAR", "PLAYER_NAME", "TEAM_NAME", "MATCHUP", "WL"]
+
 # Necessary Headers for API requests
 headers = {
     "Referer": "https://www.nba.com/",
@@ -46,7 +59,171 @@ headers = {
 }
 
 
-def get_player_points(season="2020-21", season_type="Regular Season", player=None, last_n_games=0):
+# Pooled session of every request to stats.nba.com, with timeouts, retries and a global rate limit
+client = HTTPClient(
+    headers,
+    pool_size=int(os.environ.get("NBA_POOL_SIZE", 10)),
+    connect_timeout=float(os.environ.get("NBA_CONNECT_TIMEOUT", 5)),
+    read_timeout=float(os.environ.get("NBA_READ_TIMEOUT", 30)),
+    rate=float(os.environ.get("NBA_RATE", 4)),
+    retries=int(os.environ.get("NBA_RETRIES", 4))
+)
+
+
+def configure_http(pool_size=None, connect_timeout=None, read_timeout=None, rate=None, burst=None, retries=None):
+    # Change session settings, pool_size should be at least the number of concurrent fetchers, rate 0 disables the limit
+    if pool_size is not None:
+        client.resize(pool_size)
+    if connect_timeout is not None or read_timeout is not None:
+        client.timeout = (connect_timeout or client.timeout[0], read_timeout or client.timeout[1])
+    if rate is not None:
+        client.limiter = RateLimiter(rate, burst or 8) if rate else None
+    if retries is not None:
+        client.retries = retries
+
+    return client
+
+
+def http_transport(url, params):
+    return client.get(url, params)
+
+
+# Function (url, params) -> raw response body used for every request, can be replaced e.g. with a fake server
+transport = http_transport
+
+
+# Cache of raw responses, None disables caching
+default_cache_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "http_cache.sqlite")
+
+def cache_settings():
+    # Cache settings from the environment
+    return {
+        'path': os.environ.get("NBA_CACHE_PATH", default_cache_path),
+        'ttl': float(os.environ.get("NBA_CACHE_TTL", 6 * 60 * 60)),
+        'max_bytes': int(os.environ.get("NBA_CACHE_MAX_BYTES", 2 * 1024 ** 3)),
+        'offline': os.environ.get("NBA_OFFLINE", "0") == "1"
+    }
+
+
+cache = ResponseCache(current_season=current_season, **cache_settings())
+
+
+def configure_cache(path=None, ttl=None, max_bytes=None, offline=None, enabled=True):
+    # Change cache settings, a new path opens a different cache. Settings not given are kept from the current
+    # cache, or come from the environment when caching was disabled.
+    global cache
+
+    if not enabled:
+        cache = None
+        return cache
+
+    if cache is None:
+        settings = cache_settings()
+    else:
+        settings = {'path': cache.path, 'ttl': cache.ttl, 'max_bytes': cache.max_bytes, 'offline': cache.offline}
+
+    changes = {'path': path, 'ttl': ttl, 'max_bytes': max_bytes, 'offline': offline}
+    settings.update({name: value for name, value in changes.items() if value is not None})
+
+    if cache is None or settings['path'] != cache.path:
+        cache = ResponseCache(current_season=current_season, **settings)
+    else:
+        cache.ttl, cache.max_bytes, cache.offline = settings['ttl'], settings['max_bytes'], settings['offline']
+
+    return cache
+
+
+# Cache in use before record mode turned caching off, restored when leaving record mode
+_recording = False
+_cache_before_record = None
+
+
+def configure_transport(mode="live", fixtures=None, server_url=None):
+    # live: requests go to stats.nba.com, or to server_url (e.g. a replay.ReplayServer) when it is given,
+    # record: like live and every response is saved in the fixtures directory,
+    # replay: responses come only from the fixtures directory, without any network
+    global transport, cache, _recording, _cache_before_record
+
+    live = http_transport if server_url is None else server_transport(server_url, http_transport)
+    store = FixtureStore(fixtures or default_fixture_dir)
+
+    if mode == "live":
+        transport = live
+    elif mode == "record":
+        transport = recording_transport(store, live)
+    elif mode == "replay":
+        transport = replay_transport(store)
+    else:
+        raise ValueError(f"Unknown transport mode {mode}")
+
+    if mode == "record" and not _recording:
+        # Responses served from the cache would never reach the transport and be recorded
+        _recording, _cache_before_record = True, cache
+        configure_cache(enabled=False)
+    elif mode != "record" and _recording:
+        _recording, cache, _cache_before_record = False, _cache_before_record, None
+
+    return transport
+
+
+# Transport chosen with NBA_TRANSPORT (live, record or replay), NBA_FIXTURES and NBA_SERVER_URL
+if os.environ.get("NBA_TRANSPORT", "live") != "live" or os.environ.get("NBA_SERVER_URL"):
+    configure_transport(os.environ.get("NBA_TRANSPORT", "live"), os.environ.get("NBA_FIXTURES"), os.environ.get("NBA_SERVER_URL"))
+
+
+def fetch_body(url, params):
+    # Return raw response body, served from the cache when possible
+    with span("fetch", endpoint=url.rsplit("/", 1)[-1], season=params.get("Season", "")) as attributes:
+        if cache is None:
+            body = transport(url, params)
+        else:
+            body = cache.fetch(url, params, transport)
+
+        attributes['bytes'] = len(body)
+
+        return body
+
+
+def fetch(url, params):
+    # Return decoded JSON response
+    return json.loads(fetch_body(url, params))
+
+
+def result_set_frame(rows, columns):
+    # Responses without rows (e.g. no games since DateFrom) still give a frame with all columns.
+    # Rows are read column by column, so JSON numbers stay numbers instead of one array of strings
+    if len(rows) == 0:
+        return pd.DataFrame(columns=columns)
+
+    return pd.DataFrame(rows, columns=columns)
+
+
+def set_types(df):
+    # Compact types of parsed columns: dates, integer ids, categories of repeated names and numbers for the rest
+    for column in df.columns:
+        if column == "GAME_DATE":
+            df[column] = pd.to_datetime(df[column], format="%Y-%m-%dT%H:%M:%S")
+        elif column in integer_columns:
+            df[column] = df[column].astype("int64")
+        elif column in category_columns:
+            df[column] = df[column].astype("category")
+        else:
+            df[column] = pd.to_numeric(df[column], errors="coerce")
+
+    return df
+
+
+def home_games(matchups):
+    # 1 for home games ("ATL vs. BOS"), 0 for away games ("ATL @ BOS")
+    return (~matchups.str.contains("@", regex=False)).astype("int8")
+
+
+def opponents(matchups):
+    # Opponent name from the last abbreviation of every matchup, looked up once per distinct matchup
+    return matchups.map({matchup: abbreviations[matchup.split()[2]] for matchup in matchups.unique()})
+
+
+def get_player_points(season="2020-21", season_type="Regular Season", player=None, last_n_games=0, date_from=""):
     url = "https://stats.nba.com/stats/playergamelogs"
     params = {
         "LastNGames": last_n_games,
@@ -64,19 +241,20 @@ def get_player_points(season="2020-21", season_type="Regular Season", player=Non
         "SeasonType": season_type
     }
     
-    response = requests.get(url, headers=headers, params=params).json()
+    # Only games played on or after date_from (MM/DD/YYYY)
+    if date_from:
+        params["DateFrom"] = date_from
 
-    df = pd.DataFrame(np.array(response["resultSets"][0]["rowSet"]), columns=response["resultSets"][0]["headers"])
-    df = df[["SEASON_YEAR", "PLAYER_NAME","TEAM_NAME", "GAME_ID", "GAME_DATE", "MATCHUP", 'MIN', "WL", "PTS"]]
+    # Only the kept columns of the player's rows are decoded
+    columns = ["SEASON_YEAR", "PLAYER_NAME","TEAM_NAME", "GAME_ID", "GAME_DATE", "MATCHUP", 'MIN', "WL", "PTS"]
+    rows = read_rows(fetch_body(url, params), columns, {"PLAYER_NAME": player} if player is not None else None)
 
-    # Filter player if specified
-    if player is not None:
-        df = df[df["PLAYER_NAME"] == player]
+    df = result_set_frame(rows, columns)
 
-    df['H/A'] = df['MATCHUP'].apply(lambda x: 0 if "@" in x else 1)
-    df['MATCHUP'] = df['MATCHUP'].apply(lambda x: abbreviations[x.split()[2]])
+    df['H/A'] = home_games(df['MATCHUP'])
+    df['MATCHUP'] = opponents(df['MATCHUP'])
 
-    return df
+    return set_types(df)
 
 
 def get_player_stats(season="2020-21", season_type="Regular Season", player=None, last_n_games=0):
@@ -97,19 +275,16 @@ def get_player_stats(season="2020-21", season_type="Regular Season", player=None
         "SeasonType": season_type
     }
     
-    response = requests.get(url, headers=headers, params=params).json()
+    # Only the kept columns of the player's rows are decoded
+    columns = ["SEASON_YEAR", "PLAYER_NAME","TEAM_NAME", "GAME_ID", "GAME_DATE", "MATCHUP", 'MIN', "WL", "PTS"]
+    rows = read_rows(fetch_body(url, params), columns, {"PLAYER_NAME": player} if player is not None else None)
 
-    df = pd.DataFrame(np.array(response["resultSets"][0]["rowSet"]), columns=response["resultSets"][0]["headers"])
-    df = df[["SEASON_YEAR", "PLAYER_NAME","TEAM_NAME", "GAME_ID", "GAME_DATE", "MATCHUP", 'MIN', "WL", "PTS"]]
-
-    # Filter player if specified
-    if player is not None:
-        df = df[df["PLAYER_NAME"] == player]
+    df = result_set_frame(rows, columns)
 
-    df['H/A'] = df['MATCHUP'].apply(lambda x: 0 if "@" in x else 1)
-    df['MATCHUP'] = df['MATCHUP'].apply(lambda x: abbreviations[x.split()[2]])
+    df['H/A'] = home_games(df['MATCHUP'])
+    df['MATCHUP'] = opponents(df['MATCHUP'])
 
-    return df
+    return set_types(df)
 
 
 def get_team_opponent_shooting(season="2020-21", season_type="Regular Season", team=None, last_n_games=0):
@@ -143,9 +318,9 @@ def get_team_opponent_shooting(season="2020-21", season_type="Regular Season", t
         "StarterBench": ""
     }
 
-    response = requests.get(url, headers=headers, params=params).json()
+    response = fetch(url, params)
 
-    df = pd.DataFrame(np.array(response["resultSets"]["rowSet"]), columns=response["resultSets"]["headers"][1]["columnNames"])  
+    df = result_set_frame(response["resultSets"]["rowSet"], response["resultSets"]["headers"][1]["columnNames"])  
     df = df[["TEAM_NAME", "TEAM_ID", "OPP_FG_PCT"]]
     df = rename_shooting_df_columns(df, response["resultSets"]["headers"][0]["columnNames"], "OPP_FG_PCT")       # Rename columns
     
@@ -155,7 +330,7 @@ def get_team_opponent_shooting(season="2020-21", season_type="Regular Season", t
     
     df['SEASON_YEAR'] = season
 
-    return df
+    return set_types(df)
 
 
 def get_player_shooting(season="2020-21", season_type="Regular Season", player=None, last_n_games=0):
@@ -197,9 +372,9 @@ def get_player_shooting(season="2020-21", season_type="Regular Season", player=N
         "Outcome": ""
     }
 
-    response = requests.get(url, headers=headers, params=params).json()
+    response = fetch(url, params)
 
-    df = pd.DataFrame(np.array(response["resultSets"]["rowSet"]), columns=response["resultSets"]["headers"][1]["columnNames"])
+    df = result_set_frame(response["resultSets"]["rowSet"], response["resultSets"]["headers"][1]["columnNames"])
     df = df[["PLAYER_NAME", "TEAM_ID", "FGA"]]
     df = rename_shooting_df_columns(df, response["resultSets"]["headers"][0]["columnNames"], "FGA")    # Rename column names
 
@@ -209,7 +384,7 @@ def get_player_shooting(season="2020-21", season_type="Regular Season", player=N
 
     df['SEASON_YEAR'] = season
 
-    return df
+    return set_types(df)
 
 
 def get_team_stats(season="2020-21", season_type="Regular Season", team=None, last_n_games=0):
@@ -247,19 +422,19 @@ def get_team_stats(season="2020-21", season_type="Regular Season", team=None, la
         "TwoWay": 0
     }
 
-    response = requests.get(url, headers=headers, params=params).json()
+    response = fetch(url, params)
 
-    df = pd.DataFrame(np.array(response["resultSets"][0]["rowSet"]), columns=response["resultSets"][0]["headers"])
+    df = result_set_frame(response["resultSets"][0]["rowSet"], response["resultSets"][0]["headers"])
     df = df[["TEAM_NAME", "TEAM_ID", "W_PCT", "OFF_RATING", "DEF_RATING", "PACE"]]
 
     # Filter player if specified
     if team is not None:
         df = df[df["TEAM_NAME"] == team]
     
-    return df
+    return set_types(df)
 
 
-def get_team_results(season="2020-21", season_type="Regular Season", team=None, last_n_games=0):
+def get_team_results(season="2020-21", season_type="Regular Season", team=None, last_n_games=0, date_from=""):
     url = "https://stats.nba.com/stats/teamgamelogs"
     params = {
         "Conference": "",
@@ -280,7 +455,7 @@ def get_team_results(season="2020-21", season_type="Regular Season", team=None,
         "TeamID": 0,
         "Location": "",
         "SeasonSegment": "",
-        "DateFrom": "",
+        "DateFrom": date_from,
         "DateTo": "",
         "VsConference": "",
         "VsDivision": "",
@@ -294,18 +469,18 @@ def get_team_results(season="2020-21", season_type="Regular Season", team=None,
         "TwoWay": 0
     }
 
-    response = requests.get(url, headers=headers, params=params).json()
+    response = fetch(url, params)
     
-    df = pd.DataFrame(np.array(response["resultSets"][0]["rowSet"]), columns=response["resultSets"][0]["headers"])
+    df = result_set_frame(response["resultSets"][0]["rowSet"], response["resultSets"][0]["headers"])
     df = df[["TEAM_NAME", "TEAM_ID", 'SEASON_YEAR', "GAME_ID", "GAME_DATE", 'MATCHUP', "OFF_RATING", "DEF_RATING", "PACE", "WL"]]
     
     # Filter player if specified
     if team is not None:
         df = df[df["TEAM_NAME"] == team]
 
-    df['MATCHUP'] = df['MATCHUP'].apply(lambda x: abbreviations[x.split()[2]])
+    df['MATCHUP'] = opponents(df['MATCHUP'])
     
-    return df
+    return set_types(df)
 
 
 def rename_shooting_df_columns(df, columns, sufix):
@@ -0,0 +1,153 @@
+import time
+import random
+import threading
+import collections
+import numpy as np
+import requests
+
+from requests.adapters import HTTPAdapter
+
+
+# Responses worth retrying: throttling and server errors
+retry_statuses = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    # Token bucket shared by every thread: at most rate requests per second on average and burst at once.
+    # acquire() waits for a token, try_acquire() takes one only if it is available
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        # Take a token, or return the seconds until one is available
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self._take()
+            if wait == 0:
+                return
+
+            time.sleep(wait)
+
+    def try_acquire(self):
+        return self._take() == 0
+
+
+class HTTPClient:
+    # Pooled keep-alive session for stats.nba.com shared by every fetcher: at most pool_size connections,
+    # gzip responses, connect and read timeouts, a global rate limit and retries with jittered exponential
+    # backoff on throttling, server errors, timeouts and dropped connections. Latency of recent requests is kept.
+
+    def __init__(self, headers=None, pool_size=10, connect_timeout=5.0, read_timeout=30.0, rate=4.0, burst=8,
+                 retries=4, backoff=1.0, max_backoff=30.0, history=1000):
+        self.timeout = (connect_timeout, read_timeout)
+        self.limiter = RateLimiter(rate, burst) if rate else None
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.requests = 0
+        self.retried = 0
+        self.failed = 0
+        self.latencies = collections.deque(maxlen=history)
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        self.session.headers["Connection"] = "keep-alive"
+        self.resize(pool_size)
+
+    def resize(self, pool_size):
+        # Connections kept per host, threads wait for a free one, so set it to the number of concurrent fetchers
+        self.pool_size = pool_size
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _delay(self, attempt, response=None):
+        # Retry-After of a throttled response, otherwise full jitter: uniform up to the exponential backoff
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            return float(response.headers["Retry-After"])
+
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def get(self, url, params):
+        # Raw body of a successful response, the last error is raised when every attempt fails
+        for attempt in range(self.retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire()
+
+            start = time.perf_counter()
+            response = None
+
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+
+                if response.status_code not in retry_statuses:
+                    response.raise_for_status()
+                    body = response.content
+
+                    with self._lock:
+                        self.requests += 1
+                        self.latencies.append(time.perf_counter() - start)
+
+                    return body
+
+                if attempt == self.retries:
+                    response.raise_for_status()
+
+            # ChunkedEncodingError is a connection dropped while the body was read
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError):
+                if attempt == self.retries:
+                    with self._lock:
+                        self.failed += 1
+                    raise
+
+            except requests.exceptions.HTTPError:
+                with self._lock:
+                    self.failed += 1
+                raise
+
+            with self._lock:
+                self.retried += 1
+
+            time.sleep(self._delay(attempt, response))
+
+    def stats(self):
+        # Request counts and latency percentiles (seconds) of the recent successful requests
+        with self._lock:
+            latencies = np.array(self.latencies)
+            ret = {'requests': self.requests, 'retried': self.retried, 'failed': self.failed}
+
+        if latencies.shape[0] > 0:
+            ret.update({
+                'mean': float(latencies.mean()),
+                'p50': float(np.percentile(latencies, 50)),
+                'p95': float(np.percentile(latencies, 95)),
+                'p99': float(np.percentile(latencies, 99)),
+                'max': float(latencies.max())
+            })
+
+        return ret
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = self.retried = self.failed = 0
+            self.latencies.clear()
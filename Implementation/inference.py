@@ -0,0 +1,120 @@
+import argparse
+import numpy as np
+
+from instrument import span
+
+
+# Same as keras.backend.epsilon(), lower bound of the standard deviation in the Normalization layer
+epsilon = 1e-7
+
+activations = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+    'tanh': np.tanh
+}
+
+
+class NumpyModel:
+    # Forward pass of the Normalization -> Dense -> ... -> Dense models from model.create_model in NumPy,
+    # so predictions need neither TensorFlow nor Keras. Weights come from export_model.
+
+    def __init__(self, mean, variance, kernels, biases, activations):
+        self.mean = np.asarray(mean, dtype=np.float32).reshape(-1)
+        self.variance = np.asarray(variance, dtype=np.float32).reshape(-1)
+        self.std = np.maximum(np.sqrt(self.variance), np.float32(epsilon))
+        self.kernels = [np.asarray(kernel, dtype=np.float32) for kernel in kernels]
+        self.biases = [np.asarray(bias, dtype=np.float32) for bias in biases]
+        self.activations = list(activations)
+
+    @classmethod
+    def load(cls, src):
+        with np.load(src) as data:
+            n_layers = int(data['n_layers'])
+
+            return cls(
+                data['mean'],
+                data['variance'],
+                [data[f'kernel_{i}'] for i in range(n_layers)],
+                [data[f'bias_{i}'] for i in range(n_layers)],
+                [str(data[f'activation_{i}']) for i in range(n_layers)]
+            )
+
+    def save(self, dst):
+        arrays = {'mean': self.mean, 'variance': self.variance, 'n_layers': len(self.kernels)}
+
+        for i, (kernel, bias, activation) in enumerate(zip(self.kernels, self.biases, self.activations)):
+            arrays[f'kernel_{i}'] = kernel
+            arrays[f'bias_{i}'] = bias
+            arrays[f'activation_{i}'] = activation
+
+        np.savez(dst, **arrays)
+
+    def predict(self, features, batch_size=65536):
+        # Nx1 predictions like keras Model.predict, computed batch_size rows at a time
+        features = np.asarray(features, dtype=np.float32)
+        ret = np.empty((features.shape[0], self.kernels[-1].shape[1]), dtype=np.float32)
+
+        for start in range(0, features.shape[0], batch_size):
+            x = (features[start:start + batch_size] - self.mean) / self.std
+
+            for kernel, bias, activation in zip(self.kernels, self.biases, self.activations):
+                x = activations[activation](x @ kernel + bias)
+
+            ret[start:start + batch_size] = x
+
+        return ret
+
+
+def predict_points(model, features):
+    # Works with both NumpyModel and keras models
+    with span("predict", model=type(model).__name__, rows=len(features)):
+        return model.predict(features)
+
+
+def export_model(model, dst=None):
+    # Extract normalization statistics and dense weights of a trained keras model
+    normalization = model.layers[0]
+    mean, variance = normalization.get_weights()[:2]
+
+    kernels, biases, layer_activations = [], [], []
+    for layer in model.layers[1:]:
+        kernel, bias = layer.get_weights()
+        kernels.append(kernel)
+        biases.append(bias)
+        layer_activations.append(layer.get_config()['activation'])
+
+    ret = NumpyModel(mean, variance, kernels, biases, layer_activations)
+
+    if dst is not None:
+        ret.save(dst)
+
+    return ret
+
+
+if __name__ == "__main__":
+    from model import load_model
+
+    # Create command line parser
+    parser = argparse.ArgumentParser()
+
+    # Add command line arguments
+    parser.add_argument('--models', nargs='+', default=['data/nba_predictor_playoffs', 'data/nba_predictor_regularseason'], help='Saved keras models to export')
+    parser.add_argument('--tolerance', type=float, default=1e-5, help='Largest allowed difference from keras predictions')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    for src in args.models:
+        model = load_model(src)
+        numpy_model = export_model(model, f"{src}.npz")
+
+        # Compare with keras on inputs around the normalization statistics
+        rng = np.random.default_rng(0)
+        features = numpy_model.mean + numpy_model.std * rng.standard_normal((1024, numpy_model.mean.shape[0])).astype(np.float32)
+        diff = np.max(np.abs(numpy_model.predict(features) - model.predict(features)))
+
+        print(f"{src}.npz: max difference from keras {diff:.2e}")
+
+        if diff > args.tolerance:
+            raise SystemExit(f"{src}.npz does not match keras predictions within {args.tolerance}")
@@ -0,0 +1,168 @@
+import io
+import os
+import sys
+import json
+import time
+import atexit
+import pstats
+import cProfile
+import inspect
+import functools
+import threading
+import tracemalloc
+import contextlib
+
+
+# Spans are recorded only when NBA_TRACE=1 (or after enable()), otherwise they cost a flag check.
+# NBA_PROFILE=cprofile,tracemalloc adds a cProfile of every outermost span and memory use of every span.
+# NBA_TRACE_FILE=<path> writes a JSON trace (chrome://tracing format) and prints a summary at exit.
+enabled = False
+profilers = set()
+
+_spans = []
+_lock = threading.Lock()
+_local = threading.local()
+_start = time.perf_counter()
+
+
+def enable(profile=()):
+    global enabled, profilers
+
+    enabled = True
+    profilers = set(profile)
+
+    if "tracemalloc" in profilers and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global enabled
+
+    enabled = False
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    # Time the enclosed block as a named span, attributes added to the yielded dict are recorded with it
+    if not enabled:
+        yield attributes
+        return
+
+    depth = getattr(_local, "depth", 0)
+    _local.depth = depth + 1
+
+    # Only one cProfile can run in a thread at a time, so only outermost spans are profiled
+    profiler = cProfile.Profile() if "cprofile" in profilers and depth == 0 else None
+    memory = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+
+    try:
+        yield attributes
+    finally:
+        if profiler is not None:
+            profiler.disable()
+
+        end = time.perf_counter()
+        _local.depth = depth
+
+        if memory is not None:
+            attributes["memory_delta"] = tracemalloc.get_traced_memory()[0] - memory
+
+        if profiler is not None:
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(15)
+            attributes["profile"] = output.getvalue()
+
+        with _lock:
+            _spans.append({
+                "name": name,
+                "start": start - _start,
+                "duration": end - start,
+                "thread": threading.get_ident(),
+                "depth": depth,
+                "attributes": attributes
+            })
+
+
+def traced(function):
+    # Record every call of function as a span named after it, with its scalar arguments as attributes
+    signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return function(*args, **kwargs)
+
+        arguments = signature.bind_partial(*args, **kwargs).arguments
+        attributes = {key: value for key, value in arguments.items() if isinstance(value, (str, int, float, bool))}
+
+        with span(function.__name__, **attributes):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def spans():
+    with _lock:
+        return list(_spans)
+
+
+def export_trace(dst):
+    # Trace in the Trace Event Format, it can be opened in chrome://tracing or Perfetto
+    events = [
+        {
+            "name": s["name"],
+            "ph": "X",
+            "ts": s["start"] * 1e6,
+            "dur": s["duration"] * 1e6,
+            "pid": os.getpid(),
+            "tid": s["thread"],
+            "args": {key: value if isinstance(value, (str, int, float, bool)) or value is None else str(value) for key, value in s["attributes"].items()}
+        }
+        for s in spans()
+    ]
+
+    with open(dst, "w") as f:
+        json.dump({"traceEvents": events}, f)
+
+
+def summary():
+    # Table of spans grouped by name: calls, total, mean and max time, and bytes when spans recorded them
+    groups = {}
+
+    for s in spans():
+        group = groups.setdefault(s["name"], {"calls": 0, "total": 0.0, "max": 0.0, "bytes": 0})
+        group["calls"] += 1
+        group["total"] += s["duration"]
+        group["max"] = max(group["max"], s["duration"])
+        group["bytes"] += s["attributes"].get("bytes", 0)
+
+    lines = [f"{'span':<28}{'calls':>7}{'total ms':>12}{'mean ms':>11}{'max ms':>11}{'MB':>9}"]
+
+    for name, group in sorted(groups.items(), key=lambda item: -item[1]["total"]):
+        lines.append(
+            f"{name:<28}{group['calls']:>7}{group['total'] * 1e3:>12.1f}{group['total'] / group['calls'] * 1e3:>11.2f}"
+            f"{group['max'] * 1e3:>11.2f}{group['bytes'] / 1024 ** 2:>9.2f}"
+        )
+
+    return "\n".join(lines)
+
+
+def _export_at_exit(dst):
+    export_trace(dst)
+    print(summary(), file=sys.stderr)
+
+
+if os.environ.get("NBA_TRACE", "0") == "1":
+    enable([profiler for profiler in os.environ.get("NBA_PROFILE", "").split(",") if profiler])
+
+    if os.environ.get("NBA_TRACE_FILE"):
+        atexit.register(_export_at_exit, os.environ["NBA_TRACE_FILE"])
@@ -0,0 +1,174 @@
+import re
+import json
+
+
+# Incremental reader of stats.nba.com responses: rows of the first result set are decoded one at a time
+# and only the requested columns of matching rows are kept, so a large response is never turned into
+# Python objects as a whole. The raw body is scanned as bytes, only headers and rows are decoded.
+# Everything outside the result set is skipped.
+
+_whitespace = re.compile(rb"[ \t\n\r]*")
+_string = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+_scalar = re.compile(rb'[^,\]}\s]+')
+_structural = re.compile(rb'[\[\]{}"]')
+
+# Array of scalars, e.g. a row or the headers, matched in one go
+_flat_array = re.compile(rb'\[[^\[\]{}"]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^\[\]{}"]*)*\]', re.S)
+
+# Row of a rowSet and the comma or bracket after it
+_row = re.compile(rb'[ \t\n\r]*(' + _flat_array.pattern + rb')[ \t\n\r]*([,\]])', re.S)
+
+
+def _skip(body, pos):
+    return _whitespace.match(body, pos).end()
+
+
+def _expect(body, pos, char):
+    # Position after char, which must be the next non whitespace character
+    pos = _skip(body, pos)
+
+    if body[pos:pos + 1] != char:
+        raise ValueError(f"Expected {char.decode()!r} at position {pos} of the response")
+
+    return pos + 1
+
+
+def _value_end(body, pos):
+    # Position after the value that starts at pos, found without decoding it
+    first = body[pos:pos + 1]
+
+    if first == b'"':
+        return _string.match(body, pos).end()
+
+    if first not in (b"[", b"{"):
+        return _scalar.match(body, pos).end()
+
+    flat = _flat_array.match(body, pos)
+    if flat is not None:
+        return flat.end()
+
+    depth = 0
+    while True:
+        match = _structural.search(body, pos)
+        if match is None:
+            raise ValueError("Response ends inside a value")
+
+        if match.group() == b'"':
+            pos = _string.match(body, match.start()).end()
+            continue
+
+        pos = match.end()
+        depth += 1 if match.group() in (b"[", b"{") else -1
+
+        if depth == 0:
+            return pos
+
+
+def _decode(body, pos):
+    # Value that starts at pos decoded on its own, and the position after it
+    end = _value_end(body, pos)
+
+    return json.loads(body[pos:end]), end
+
+
+def _members(body, pos, visit):
+    # Walk the members of the object that starts at pos, visit(key, pos) returns the position after the value
+    pos = _expect(body, pos, b"{")
+
+    if body[_skip(body, pos):_skip(body, pos) + 1] == b"}":
+        return _skip(body, pos) + 1
+
+    while True:
+        key, pos = _decode(body, _skip(body, pos))
+        pos = visit(key, _skip(body, _expect(body, pos, b":")))
+        pos = _skip(body, pos)
+
+        if body[pos:pos + 1] == b"}":
+            return pos + 1
+
+        pos = _expect(body, pos, b",")
+
+
+def _needle(value):
+    # Bytes every row matching value contains, None when value could be written with escapes
+    if not isinstance(value, str) or not value.isascii() or any(char in value for char in '"\\/') or not value.isprintable():
+        return None
+
+    return json.dumps(value).encode()
+
+
+def read_rows(body, columns, where=None):
+    # Rows of the first result set with only the given columns, where is an optional {column: value}
+    # every kept row must match, e.g. {"PLAYER_NAME": player}
+    body = body.encode() if isinstance(body, str) else body
+    result = {}
+
+    def read_rows_of(pos):
+        # rowSet array, decoded row by row
+        headers = result.get("headers")
+
+        if headers is None:
+            raise ValueError("Response has rowSet before headers")
+
+        indexes = [headers.index(column) for column in columns]
+        filters = [(headers.index(column), value) for column, value in (where or {}).items()]
+        rows = result["rows"] = []
+
+        # Rows without the bytes of a where value are skipped without decoding them
+        needles = [needle for needle in (_needle(value) for _, value in filters) if needle is not None]
+
+        pos = _skip(body, _expect(body, pos, b"["))
+        if body[pos:pos + 1] == b"]":
+            return pos + 1
+
+        while True:
+            match = _row.match(body, pos)
+            if match is None:
+                raise ValueError(f"Expected a row at position {pos} of the response")
+
+            row = match.group(1)
+            if all(needle in row for needle in needles):
+                row = json.loads(row)
+
+                if all(row[i] == value for i, value in filters):
+                    rows.append([row[i] for i in indexes])
+
+            pos = match.end()
+            if match.group(2) == b"]":
+                return pos
+
+    def visit_result_set(key, pos):
+        if key == "headers":
+            result["headers"], pos = _decode(body, pos)
+
+            return pos
+
+        if key == "rowSet":
+            return read_rows_of(pos)
+
+        return _value_end(body, pos)
+
+    def visit_response(key, pos):
+        if key != "resultSets" or "rows" in result:
+            return _value_end(body, pos)
+
+        # List of result sets (game logs, team stats) or a single one, only the first is read
+        if body[pos:pos + 1] != b"[":
+            return _members(body, pos, visit_result_set)
+
+        if body[_skip(body, pos + 1):_skip(body, pos + 1) + 1] == b"]":
+            return _skip(body, pos + 1) + 1
+
+        pos = _members(body, pos + 1, visit_result_set)
+
+        while body[_skip(body, pos):_skip(body, pos) + 1] != b"]":
+            pos = _value_end(body, _skip(body, _expect(body, pos, b",")))
+
+        return _skip(body, pos) + 1
+
+    _members(body, _skip(body, 0), visit_response)
+
+    if "rows" not in result:
+        raise ValueError("Response has no result set rows")
+
+    return result["rows"]
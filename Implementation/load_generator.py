@@ -0,0 +1,91 @@
+import json
+import time
+import asyncio
+import argparse
+import urllib.parse
+import numpy as np
+
+from batch import read_slate
+
+
+async def client(host, port, path, games, n_requests, latencies, errors):
+    # One keep-alive connection sending n_requests predictions one after another
+    reader, writer = await asyncio.open_connection(host, port)
+
+    try:
+        for i in range(n_requests):
+            body = json.dumps(games[i % len(games)]).encode()
+
+            start = time.perf_counter()
+            writer.write(
+                f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run(url, games, concurrency, n_requests):
+    # Spread n_requests over concurrency connections and report latency percentiles and throughput
+    url = urllib.parse.urlparse(url)
+    latencies, errors = [], []
+
+    per_client = [n_requests // concurrency + (i < n_requests % concurrency) for i in range(concurrency)]
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(url.hostname, url.port or 80, url.path or "/predict", games, n, latencies, errors) for n in per_client if n > 0])
+    seconds = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'concurrency': concurrency,
+        'seconds': seconds,
+        'throughput': len(latencies) / seconds,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'max_ms': float(latencies.max())
+    }
+
+
+if __name__ == "__main__":
+    # Create command line parser
+    parser = argparse.ArgumentParser()
+
+    # Add command line arguments
+    parser.add_argument('slate', help='<Required> CSV or JSON file of games sent round robin, see batch.py')
+    parser.add_argument('--url', default='http://127.0.0.1:8000/predict')
+    parser.add_argument('--concurrency', '-c', type=int, nargs='+', default=[1, 8, 64], help='Concurrent connections, one run per value')
+    parser.add_argument('--requests', '-n', type=int, default=1000, help='Requests per run')
+    parser.add_argument('--json', help='Save results to this JSON file')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    games = read_slate(args.slate).to_dict(orient='records')
+    results = [asyncio.run(run(args.url, games, concurrency, args.requests)) for concurrency in args.concurrency]
+
+    print(f"{'concurrency':>12}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for result in results:
+        print(f"{result['concurrency']:>12}{result['requests']:>10}{result['errors']:>8}{result['throughput']:>10.1f}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}")
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
@@ -6,16 +6,21 @@ import warnings
 import streamlit as st
 
 from generate_data import generate_features
-from model import load_model, predict_points
+from feature_store import FeatureStore
+from inference import predict_points
+from registry import registry
+
+
+# Precomputed features, predictions fall back to live requests when it is missing or stale
+feature_store = FeatureStore()
 
 
 def main(player, team, opponent, season_type, home_game, b2b=None):
-    # Load model
-    model_name = season_type.replace(" ", "").lower()
-    model = load_model(f"Implementation/data/nba_predictor_{model_name}")
+    # Model stays loaded between predictions
+    model = registry.get(season_type)
 
     # Generate input features for a player
-    features = generate_features(player, team, opponent, season_type, home_game, b2b)
+    features = generate_features(player, team, opponent, season_type, home_game, b2b, store=feature_store)
 
     # Predict player points
     pts = predict_points(model, features)
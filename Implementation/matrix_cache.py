@@ -0,0 +1,165 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import numpy as np
+
+from dataset import prepare_dataset, remove_outliers, split_features_and_labels
+from generate_data import get_dataset
+
+
+# Directory with prepared matrices, NBA_PREPARED_DIR also reaches training processes
+default_cache_dir = os.environ.get("NBA_PREPARED_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "prepared"))
+
+# Bump when prepare_dataset or the saved files change, so matrices prepared by the old version are not used
+version = 3
+
+_fingerprints_lock = threading.Lock()
+
+
+class PreparedMatrix:
+    # float32 features and labels of a prepared dataset, memory mapped from the cache, with the feature
+    # column order and the season, player and team of every row as codes into season_names, player_names and team_names.
+    # Rows are sorted by season, so the rows of any run of seasons are a contiguous slice.
+    def __init__(self, directory):
+        self.directory = directory
+
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+
+        self.columns = meta['columns']
+        self.season_names = meta['season_names']
+        self.player_names = meta['player_names']
+        self.team_names = meta['team_names']
+        self.source = meta['source']
+
+        self.x = np.load(os.path.join(directory, "x.npy"), mmap_mode='r')
+        self.y = np.load(os.path.join(directory, "y.npy"), mmap_mode='r')
+        self.seasons = np.load(os.path.join(directory, "seasons.npy"), mmap_mode='r')
+        self.players = np.load(os.path.join(directory, "players.npy"), mmap_mode='r')
+        self.teams = np.load(os.path.join(directory, "teams.npy"), mmap_mode='r')
+        self.positions = np.load(os.path.join(directory, "positions.npy"), mmap_mode='r')
+
+    def locate(self, positions):
+        # Matrix rows of the given positions in the prepared dataset, e.g. of a split made with dataset.split_rows
+        return np.argsort(self.positions)[positions]
+
+    def season_rows(self, first, last):
+        # Slice of the rows of seasons first..last (codes into season_names), a view of the memory mapped files
+        return slice(int(np.searchsorted(self.seasons, first, side='left')), int(np.searchsorted(self.seasons, last, side='right')))
+
+
+def file_hash(path, cache_dir=default_cache_dir):
+    # SHA-256 of a file's content, computed again only when its size or modification time changes
+    stat = os.stat(path)
+    fingerprints_path = os.path.join(cache_dir, "fingerprints.json")
+
+    with _fingerprints_lock:
+        try:
+            with open(fingerprints_path) as f:
+                fingerprints = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            fingerprints = {}
+
+        entry = fingerprints.get(os.path.abspath(path))
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['sha256']
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 ** 2), b""):
+                digest.update(block)
+
+        fingerprints[os.path.abspath(path)] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{fingerprints_path}.tmp{os.getpid()}"
+        with open(tmp, "w") as f:
+            json.dump(fingerprints, f, indent=4)
+        os.replace(tmp, fingerprints_path)
+
+        return digest.hexdigest()
+
+
+def cache_key(src, min_minutes=23, frac=None, cache_dir=default_cache_dir):
+    # Same dataset content and prepare_dataset parameters give the same key, wherever the dataset is
+    return hashlib.sha256(f"{file_hash(src, cache_dir)}|min_minutes={min_minutes}|frac={frac}|version={version}".encode()).hexdigest()[:32]
+
+
+def prepared_matrix(src, min_minutes=23, frac=None, cache_dir=default_cache_dir):
+    # Prepared dataset src as float32 matrices, prepared once and memory mapped from the cache afterwards.
+    # frac removes outliers like dataset.remove_outliers, None keeps every row.
+    directory = os.path.join(cache_dir, cache_key(src, min_minutes, frac, cache_dir))
+
+    if not os.path.exists(os.path.join(directory, "meta.json")):
+        save_matrix(src, directory, min_minutes, frac)
+
+    return PreparedMatrix(directory)
+
+
+def save_matrix(src, directory, min_minutes=23, frac=None):
+    df = get_dataset(src)
+    prepared = prepare_dataset(df, min_minutes)
+
+    if frac is not None:
+        prepared = remove_outliers(prepared, frac)
+
+    x, y = split_features_and_labels(prepared)
+
+    # Ids are dropped by prepare_dataset, rows keep their index
+    ids = {column: df.loc[prepared.index, column].astype(str) for column in ['SEASON_YEAR', 'PLAYER_NAME', 'TEAM_NAME']}
+    names = {column: sorted(values.unique()) for column, values in ids.items()}
+
+    # Files are written to a temporary directory that is renamed when complete, so readers never see a partial matrix
+    tmp = f"{directory}.tmp{os.getpid()}.{threading.get_ident()}"
+    os.makedirs(tmp, exist_ok=True)
+
+    codes = {column: np.searchsorted(names[column], values.values) for column, values in ids.items()}
+
+    # Rows sorted by season, positions keep where every row was in the prepared dataset
+    positions = np.argsort(codes['SEASON_YEAR'], kind='stable')
+
+    np.save(os.path.join(tmp, "x.npy"), x.to_numpy(dtype=np.float32)[positions])
+    np.save(os.path.join(tmp, "y.npy"), y.to_numpy(dtype=np.float32)[positions])
+    np.save(os.path.join(tmp, "seasons.npy"), codes['SEASON_YEAR'][positions].astype(np.int16))
+    np.save(os.path.join(tmp, "players.npy"), codes['PLAYER_NAME'][positions].astype(np.int32))
+    np.save(os.path.join(tmp, "teams.npy"), codes['TEAM_NAME'][positions].astype(np.int16))
+    np.save(os.path.join(tmp, "positions.npy"), positions.astype(np.int64))
+
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({
+            'source': os.path.abspath(src),
+            'sha256': file_hash(src, os.path.dirname(directory)),
+            'min_minutes': min_minutes,
+            'frac': frac,
+            'columns': list(x.columns),
+            'season_names': names['SEASON_YEAR'],
+            'player_names': names['PLAYER_NAME'],
+            'team_names': names['TEAM_NAME']
+        }, f, indent=4)
+
+    try:
+        os.rename(tmp, directory)
+    except OSError:
+        # Prepared by someone else in the meantime
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    prune(os.path.dirname(directory), os.path.abspath(src), keep=os.path.basename(directory))
+
+
+def prune(cache_dir, source, keep):
+    # Remove matrices prepared from earlier contents of the source dataset, they can never be used again
+    sha256 = file_hash(source, cache_dir)
+
+    for name in os.listdir(cache_dir):
+        meta_path = os.path.join(cache_dir, name, "meta.json")
+
+        if name == keep or ".tmp" in name or not os.path.exists(meta_path):
+            continue
+
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+        if meta['source'] == source and meta['sha256'] != sha256:
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
@@ -1,16 +1,22 @@
-import matplotlib.pyplot as plt
+import os
+import time
+import shutil
+import argparse
+import multiprocessing
 import numpy as np
 import pandas as pd
-import seaborn as sns
 
 import tensorflow as tf
-import keras_tuner as kt
 
 from tensorflow import keras
 from tensorflow.keras import layers
 from tensorflow.keras.layers.experimental import preprocessing
 
-from generate_data import get_dataset
+from concurrent.futures import ProcessPoolExecutor
+
+from generate_data import find_dataset, get_dataset, get_dataset_chunks
+from dataset import prepare_dataset, remove_outliers, split_dataset, split_rows, split_features_and_labels
+from matrix_cache import prepared_matrix
 
 
 def make_np_print_prettier():
@@ -18,44 +24,51 @@ def make_np_print_prettier():
     np.set_printoptions(precision=3, suppress=True)
 
 
-def prepare_dataset(df, min_minutes=23):
-    # Clean data
-    df = df.drop(columns=['SEASON_YEAR', 'PLAYER_NAME', 'TEAM_NAME', 'GAME_ID', 'MATCHUP', 'WL'])
-    df[df.columns] = df[df.columns].apply(pd.to_numeric, errors='coerce')
-
-    # Drop stats with players who played under min_minutes
-    df = df[df['MIN'] > min_minutes]
-
-    # Drop any stil NaN information
-    df.dropna(inplace=True)
+def stream_dataset(src, subset, test_pct=0.2, validation_split=0.2, min_minutes=23, chunk_size=65536):
+    # Prepared rows of one subset ('train', 'validation' or 'test') of a dataset file, read chunk by chunk.
+    # Rows are spread over subsets by their position, evenly and the same way on every pass.
+    position = 0
 
-    return df
+    for chunk in get_dataset_chunks(src, chunk_size):
+        x, y = split_features_and_labels(prepare_dataset(chunk, min_minutes))
 
+        # Low-discrepancy sequence in [0, 1) decides the subset of every row
+        u = ((np.arange(position, position + x.shape[0]) + 1) * 0.6180339887498949) % 1
+        position += x.shape[0]
 
-def remove_outliers(df, frac=0.45):
-    return df[abs(df['PTS'] - (df['PTS_PG'] + df['LAST_N_PTS_PG']) / 2) < ((df['PTS_PG'] + df['LAST_N_PTS_PG']) * (0.5 * frac))]
+        if subset == 'test':
+            mask = u < test_pct
+        elif subset == 'validation':
+            mask = (u >= test_pct) & (u < test_pct + (1 - test_pct) * validation_split)
+        else:
+            mask = u >= test_pct + (1 - test_pct) * validation_split
 
+        yield x[mask].to_numpy(dtype=np.float32), y[mask].to_numpy(dtype=np.float32)
 
-def split_dataset(df, train_pct=0.8): 
-    # Split training and test data
-    train = df.sample(frac=train_pct, random_state=0)
-    test = df.drop(train.index)
 
-    return train, test
+def make_tf_dataset(src, subset, batch_size=32, shuffle_buffer=10000, **kwargs):
+    # Streaming tf.data input pipeline: chunks are split into rows, shuffled in a bounded buffer, batched and prefetched
+    n_features = next(stream_dataset(src, subset, **kwargs))[0].shape[1]
 
+    ds = tf.data.Dataset.from_generator(
+        lambda: stream_dataset(src, subset, **kwargs),
+        output_signature=(
+            tf.TensorSpec(shape=(None, n_features), dtype=tf.float32),
+            tf.TensorSpec(shape=(None,), dtype=tf.float32)
+        )
+    )
+    ds = ds.unbatch()
 
-def split_features_and_labels(df):
-    # Split features and labels
-    df_x = df.drop(columns=['PTS', 'MIN'])
-    df_y = df['PTS']
+    if subset == 'train':
+        ds = ds.shuffle(shuffle_buffer)
 
-    return df_x, df_y
+    return ds.batch(batch_size).prefetch(tf.data.experimental.AUTOTUNE)
 
 
 def create_model(train_x):
-    # Input layer
+    # Input layer, a tf.data dataset of features is adapted in one streaming pass
     input_layer = preprocessing.Normalization(axis=-1)
-    input_layer.adapt(np.array(train_x))
+    input_layer.adapt(train_x if isinstance(train_x, tf.data.Dataset) else np.array(train_x))
 
     # Build model
     model = keras.Sequential([
@@ -73,13 +86,19 @@ def create_model(train_x):
     return model
 
 
-def train_model(model, train_x, train_y, validation_split=0.2, verbose=0, epochs=100):
+def early_stopping(patience):
+    # Stop once the validation MAE (the loss) has not improved for patience epochs and keep the best weights
+    return tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=patience, restore_best_weights=True)
+
+
+def train_model(model, train_x, train_y, validation_split=0.2, verbose=0, epochs=100, patience=None):
     history = model.fit(
         train_x, 
         train_y,
         validation_split=validation_split,
         verbose=verbose,
-        epochs=epochs
+        epochs=epochs,
+        callbacks=[early_stopping(patience)] if patience is not None else None
     )
 
     return history, model
@@ -101,19 +120,114 @@ def predict_points(model, features):
     return model.predict(features)
 
 
-def hypertune(train_x, train_y):
-    # Select the right set of hyperparameters
+def normalization_layer(mean, variance):
+    # Normalization layer with already computed statistics, so they need not be adapted again
+    input_layer = preprocessing.Normalization(axis=-1)
+    input_layer.build((None, mean.shape[-1]))
+    input_layer.set_weights([mean, variance] + input_layer.get_weights()[2:])
 
-    def model_builder(hp):
-        # Model builder function returns a compiled model and uses hyperparameters defined inline to hypertune the model        
+    return input_layer
 
-        # Input layer
+
+def hypertune(train_x, train_y, workers=1, directory='hypertune_dir', project_name='hypertune', port=8470, max_epochs=10, epochs=50):
+    # Select the right set of hyperparameters. Trials run in workers processes that share one memory mapped
+    # copy of the training data, and a search already saved in directory is resumed instead of started again.
+    # A resumed search keeps the data and normalization its first trials used, train_x and train_y are then ignored.
+    data_dir = os.path.join(directory, project_name + '_data')
+    os.makedirs(data_dir, exist_ok=True)
+
+    resumed = os.path.exists(os.path.join(directory, project_name, 'oracle.json'))
+
+    if not (resumed and os.path.exists(os.path.join(data_dir, 'normalization.npz'))):
+        np.save(os.path.join(data_dir, 'train_x.npy'), np.asarray(train_x, dtype=np.float32))
+        np.save(os.path.join(data_dir, 'train_y.npy'), np.asarray(train_y, dtype=np.float32))
+
+        # Normalization statistics are computed once and reused by every trial
         input_layer = preprocessing.Normalization(axis=-1)
         input_layer.adapt(np.array(train_x))
+        mean, variance = input_layer.get_weights()[:2]
+        np.savez(os.path.join(data_dir, 'normalization.npz'), mean=mean, variance=variance)
+
+    # Trials of a resumed search are not counted again
+    completed_before = completed_trials(hypertune_tuner(data_dir, directory, project_name, max_epochs)) if resumed else 0
+
+    start = time.time()
+
+    if workers <= 1:
+        hypertune_search(data_dir, directory, project_name, max_epochs=max_epochs, epochs=epochs)
+    else:
+        # Chief process serves the oracle until the workers are done, the other processes run trials with their share of the cores
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        context = multiprocessing.get_context('spawn')
+
+        chief = context.Process(target=hypertune_search, args=(data_dir, directory, project_name, 'chief', port, threads, max_epochs, epochs), daemon=True)
+        chief.start()
+
+        tuners = [
+            context.Process(target=hypertune_search, args=(data_dir, directory, project_name, f'tuner{i}', port, threads, max_epochs, epochs))
+            for i in range(workers)
+        ]
+
+        for process in tuners:
+            process.start()
+
+        # Workers stop when the oracle has no trials left, and would wait forever for a chief that failed
+        try:
+            for process in tuners:
+                while process.is_alive():
+                    if not chief.is_alive() and chief.exitcode != 0:
+                        raise RuntimeError(f"Hyperparameter search chief exited with code {chief.exitcode}, is port {port} free?")
+
+                    process.join(1)
+        finally:
+            for process in tuners + [chief]:
+                process.terminate()
+                process.join()
+
+        failed = [process.exitcode for process in tuners if process.exitcode != 0]
+        if failed:
+            raise RuntimeError(f"Hyperparameter search workers exited with codes {failed}")
+
+    seconds = time.time() - start
+
+    # Oracle state saved in directory knows every trial, whichever process ran it
+    tuner = hypertune_tuner(data_dir, directory, project_name, max_epochs)
+    trials = completed_trials(tuner) - completed_before
+    trials_per_hour = trials / (seconds / 3600) if seconds > 0 else 0
+
+    print(f"Completed {trials} trials in {seconds / 3600:.2f} hours with {workers} worker(s) ({trials_per_hour:.1f} trials per hour)")
+
+    # Get the optimal hyperparameters
+    best_hps=tuner.get_best_hyperparameters(num_trials=1)[0]
+
+    print(
+        f"""
+            The hyperparameter search is complete.
+            The optimal number of units in the first densely-connected layer is {best_hps.get('units')}.
+            The optimal activation function in the first densely-connected layer is {best_hps.get('activation')}
+            The optimal learning rate for the optimizer is {best_hps.get('learning_rate')}.
+        """
+    )
+
+    return {'workers': workers, 'trials': trials, 'seconds': seconds, 'trials_per_hour': trials_per_hour}
+
+
+def hypertune_tuner(data_dir, directory, project_name, max_epochs=10):
+    # Hyperband tuner of the search, trials already saved in directory are reloaded
+    import keras_tuner as kt
+
+    with np.load(os.path.join(data_dir, 'normalization.npz')) as normalization:
+        mean, variance = normalization['mean'], normalization['variance']
+
+    def model_builder(hp):
+        # Model builder function returns a compiled model and uses hyperparameters defined inline to hypertune the model
+
+        # Input layer
+        input_layer = normalization_layer(mean, variance)
 
         # Tune the number of units and activation function in hidden layer
         hp_units = hp.Int('units', min_value=16, max_value=512, step=32)
-        hp_activation = hp.Choice("activation", values=['relu', 'sigmoid', 'tanh']) 
+        hp_activation = hp.Choice("activation", values=['relu', 'sigmoid', 'tanh'])
 
         # Build model
         model = keras.Sequential([
@@ -134,53 +248,180 @@ def hypertune(train_x, train_y):
 
         return model
 
-    # Instantiate hyper tuner
-    tuner = kt.Hyperband(
+    return kt.Hyperband(
         model_builder,
         objective='val_mean_absolute_error',
-        max_epochs=10,
+        max_epochs=max_epochs,
         factor=3,
-        directory='hypertune_dir',
-        project_name='hypertune'
+        directory=directory,
+        project_name=project_name,
+        overwrite=False
     )
 
+
+def hypertune_search(data_dir, directory, project_name, tuner_id=None, port=None, threads=None, max_epochs=10, epochs=50):
+    # Run the search in this process, on its own or as the chief or a worker of a distributed search.
+    # The chief serves the oracle from the tuner constructor (keras-tuner 1.0) or from search (later versions).
+    if tuner_id is not None:
+        os.environ['KERASTUNER_TUNER_ID'] = tuner_id
+        os.environ['KERASTUNER_ORACLE_IP'] = '127.0.0.1'
+        os.environ['KERASTUNER_ORACLE_PORT'] = str(port)
+
+    if threads is not None:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    tuner = hypertune_tuner(data_dir, directory, project_name, max_epochs)
+
+    train_x = np.load(os.path.join(data_dir, 'train_x.npy'), mmap_mode='r')
+    train_y = np.load(os.path.join(data_dir, 'train_y.npy'), mmap_mode='r')
+
     # A callback to stop training early after reaching a certain value of the validation loss
     stop_early = tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=5)
 
     # Run the hyperparameters search
-    tuner.search(train_x, train_y, epochs=50, validation_split=0.2, callbacks=[stop_early])
+    tuner.search(train_x, train_y, epochs=epochs, validation_split=0.2, callbacks=[stop_early])
 
-    # Get the optimal hyperparameters
-    best_hps=tuner.get_best_hyperparameters(num_trials=1)[0]
 
-    print(
-        f"""
-            The hyperparameter search is complete. 
-            The optimal number of units in the first densely-connected layer is {best_hps.get('units')}.
-            The optimal activation function in the first densely-connected layer is {best_hps.get('activation')}
-            The optimal learning rate for the optimizer is {best_hps.get('learning_rate')}.
-        """
-    )
+def hypertune_speedup(train_x, train_y, workers, directory='hypertune_dir', port=8470, max_epochs=4, epochs=8):
+    # Trials per hour of the same fresh, shortened search with one worker and with workers
+    results = []
+
+    for n in [1, workers]:
+        project_name = f'speedup_{n}_workers'
+        shutil.rmtree(os.path.join(directory, project_name), ignore_errors=True)
+        results.append(hypertune(train_x, train_y, n, directory, project_name, port, max_epochs, epochs))
+
+    print(f"{'workers':>8}{'trials':>8}{'seconds':>10}{'trials/hour':>13}")
+    for result in results:
+        print(f"{result['workers']:>8}{result['trials']:>8}{result['seconds']:>10.1f}{result['trials_per_hour']:>13.1f}")
+    print(f"Speedup with {workers} workers: {results[1]['trials_per_hour'] / max(results[0]['trials_per_hour'], 1e-9):.2f}x")
+
+    return results
+
+
+def hypertune_dataset(dataset, workers=1, project_name='hypertune', speedup=False, port=8470):
+    # Hypertune on the training rows of a dataset, from its cached prepared matrix
+    matrix = prepared_matrix(dataset)
+    train = matrix.locate(split_rows(matrix.x.shape[0])[0])
+
+    if speedup:
+        return hypertune_speedup(matrix.x[train], matrix.y[train], workers, port=port)
+
+    return hypertune(matrix.x[train], matrix.y[train], workers, project_name=project_name, port=port)
+
+
+def completed_trials(tuner):
+    return sum(1 for trial in tuner.oracle.trials.values() if trial.status == 'COMPLETED')
+
 
+def main(dataset, dst, epochs=100, patience=None, seed=None):
+    start = time.time()
 
-def main(dataset, dst):
-    df = get_dataset(dataset)
-    df = prepare_dataset(df)
+    if seed is not None:
+        tf.random.set_seed(seed)
 
-    train, test = split_dataset(df)
+    # Prepared matrix is cached, so only the first training on a dataset parses and prepares it
+    matrix = prepared_matrix(dataset)
+    train, test = (matrix.locate(rows) for rows in split_rows(matrix.x.shape[0]))
 
-    train_x, train_y = split_features_and_labels(train)
-    test_x, test_y = split_features_and_labels(test)
+    train_x, train_y = matrix.x[train], matrix.y[train]
+    test_x, test_y = matrix.x[test], matrix.y[test]
 
     model = create_model(train_x)
-    history, model = train_model(model, train_x, train_y)
+    history, model = train_model(model, train_x, train_y, epochs=epochs, patience=patience)
 
     mae = test_model(model, test_x, test_y)
     print("MAE on test: ", mae)
 
     save_model(model, dst)
-    
+
+    return {'model': dst, 'mae': mae, 'epochs': len(history.history['loss']), 'seconds': time.time() - start}
+
+
+def main_streaming(dataset, dst, batch_size=32, shuffle_buffer=10000, epochs=100, patience=None, seed=None):
+    # Same as main, but the dataset is streamed from disk, so memory does not grow with its size
+    start = time.time()
+
+    if seed is not None:
+        tf.random.set_seed(seed)
+
+    train = make_tf_dataset(dataset, 'train', batch_size, shuffle_buffer)
+    validation = make_tf_dataset(dataset, 'validation', batch_size)
+    test = make_tf_dataset(dataset, 'test', batch_size)
+
+    model = create_model(train.map(lambda x, y: x))
+    history = model.fit(
+        train,
+        validation_data=validation,
+        verbose=0,
+        epochs=epochs,
+        callbacks=[early_stopping(patience)] if patience is not None else None
+    )
+
+    mae = model.evaluate(test, verbose=0)
+    print("MAE on test: ", mae)
+
+    save_model(model, dst)
+
+    return {'model': dst, 'mae': mae, 'epochs': len(history.history['loss']), 'seconds': time.time() - start}
+
+
+def pin_threads(threads):
+    # Runs first in every training process, so parallel trainings share the cores instead of oversubscribing them
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def train_models(jobs, workers=1, streaming=False, epochs=100, patience=None):
+    # Train every (dataset, dst, seed) job, in parallel in up to workers processes with an equal share of the cores
+    train = main_streaming if streaming else main
+
+    if workers <= 1:
+        return [train(dataset, dst, epochs=epochs, patience=patience, seed=seed) for dataset, dst, seed in jobs]
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    context = multiprocessing.get_context('spawn')
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=pin_threads, initargs=(threads,)) as executor:
+        futures = [executor.submit(train, dataset, dst, epochs=epochs, patience=patience, seed=seed) for dataset, dst, seed in jobs]
+
+        return [future.result() for future in futures]
+
 
 if __name__ == "__main__":
-    main("data/nba_dataset_playoffs.csv", "data/nba_predictor_playoffs")
-    main("data/nba_dataset_regularseason.csv", "data/nba_predictor_regularseason")
\ No newline at end of file
+    # Create command line parser
+    parser = argparse.ArgumentParser()
+
+    # Add command line arguments
+    parser.add_argument('--streaming', action='store_true', help='Stream datasets from disk instead of loading them into memory')
+    parser.add_argument('--workers', type=int, default=1, help='Models trained at once, each in its own process')
+    parser.add_argument('--epochs', type=int, default=100, help='Most epochs trained')
+    parser.add_argument('--patience', type=int, help='Stop after this many epochs without a better validation MAE and keep the best weights')
+    parser.add_argument('--seeds', type=int, nargs='+', help='Train one model per seed, saved with a _seed<seed> suffix')
+
+    parser.add_argument('--hypertune', action='store_true', help='Search hyperparameters on the regular season dataset instead of training')
+    parser.add_argument('--hypertune-workers', type=int, default=1, help='Worker processes of the hyperparameter search')
+    parser.add_argument('--hypertune-speedup', action='store_true', help='Measure trials per hour of a short search with 1 and with --hypertune-workers workers')
+    parser.add_argument('--hypertune-port', type=int, default=8470, help='Local port of the distributed search oracle, apart from the prediction service port 8000')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    if args.hypertune:
+        hypertune_dataset(find_dataset("data/nba_dataset_regularseason"), args.hypertune_workers, speedup=args.hypertune_speedup, port=args.hypertune_port)
+        raise SystemExit
+
+    jobs = []
+    for season_type in ["playoffs", "regularseason"]:
+        for seed in args.seeds or [None]:
+            dst = f"data/nba_predictor_{season_type}" + (f"_seed{seed}" if args.seeds else "")
+            jobs.append((find_dataset(f"data/nba_dataset_{season_type}"), dst, seed))
+
+    start = time.time()
+    results = train_models(jobs, args.workers, args.streaming, args.epochs, args.patience)
+
+    print(f"{'model':<44}{'epochs':>8}{'seconds':>10}{'test MAE':>10}")
+    for result in results:
+        print(f"{result['model']:<44}{result['epochs']:>8}{result['seconds']:>10.1f}{result['mae']:>10.3f}")
+    print(f"Trained {len(results)} models in {time.time() - start:.1f} seconds with {args.workers} worker(s)")
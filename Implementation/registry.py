@@ -0,0 +1,87 @@
+import os
+import time
+import threading
+
+from inference import NumpyModel
+from instrument import span
+
+
+# Directory with the trained nba_predictor_* models
+default_model_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def model_name(season_type):
+    # "Regular Season" and "regularseason" name the same model
+    return season_type.replace(" ", "").lower()
+
+
+def load_any_model(path):
+    # Exported NumPy models (.npz) do not need TensorFlow, anything else is a keras SavedModel
+    if path.endswith(".npz"):
+        return NumpyModel.load(path)
+
+    from model import load_model
+    return load_model(path)
+
+
+class ModelRegistry:
+    # Models by season type, loaded once per process and kept resident, so every Streamlit session,
+    # report and batch run shares them. An exported NumPy model is preferred over the keras model.
+    # A model is loaded again when it changes on disk, which is checked at most every check_interval seconds.
+
+    def __init__(self, directory=default_model_dir, loader=load_any_model, check_interval=5.0):
+        self.directory = directory
+        self.loader = loader
+        self.check_interval = check_interval
+
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def path(self, season_type):
+        path = os.path.join(self.directory, f"nba_predictor_{model_name(season_type)}")
+
+        return path + ".npz" if os.path.exists(path + ".npz") else path
+
+    @staticmethod
+    def version(path):
+        # Latest modification time of the model file or of anything in the model directory
+        mtime = os.path.getmtime(path)
+
+        for root, dirs, files in os.walk(path):
+            for name in dirs + files:
+                mtime = max(mtime, os.path.getmtime(os.path.join(root, name)))
+
+        return mtime
+
+    def get(self, season_type):
+        name = model_name(season_type)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._models.get(name)
+
+            if entry is not None and now - entry['checked_at'] < self.check_interval:
+                return entry['model']
+
+            path = self.path(name)
+            version = self.version(path)
+
+            # Hot reload a model that was retrained, exported or replaced
+            if entry is None or entry['path'] != path or entry['version'] != version:
+                with span("load_model", path=path):
+                    model = self.loader(path)
+
+                entry = {'model': model, 'path': path, 'version': version}
+                self._models[name] = entry
+
+            entry['checked_at'] = now
+
+            return entry['model']
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+
+# Registry shared by everything running in this process
+registry = ModelRegistry()
@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+import urllib.parse
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_client import RateLimiter
+from response_cache import ResponseCache
+
+
+# Directory with recorded responses
+default_fixture_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fixtures")
+
+
+class FixtureMissing(LookupError):
+    # Raised in replay mode when a response was never recorded
+    pass
+
+
+class FixtureStore:
+    # Recorded stats.nba.com responses, one file per (endpoint, normalized params) with the raw body
+    # and one with the request it answers. The host is not part of the key, so responses recorded
+    # from stats.nba.com are also served for requests to a local ReplayServer.
+
+    def __init__(self, directory=default_fixture_dir):
+        self.directory = directory
+
+    @staticmethod
+    def key(url, params):
+        endpoint = urllib.parse.urlparse(url).path.rsplit("/", 1)[-1]
+        # Params are normalized like the response cache does, so both agree on which requests are the same
+        normalized = ResponseCache.normalize_params(params)
+
+        return f"{endpoint}-{hashlib.sha256(normalized.encode()).hexdigest()[:32]}"
+
+    def path(self, url, params):
+        return os.path.join(self.directory, self.key(url, params))
+
+    def load(self, url, params):
+        try:
+            with open(self.path(url, params) + ".body", "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise FixtureMissing(f"No recorded response for {url} {params}") from None
+
+    def save(self, url, params, body):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(url, params)
+
+        # Body is written last through a temporary file, so a response is either complete or missing
+        with open(path + ".json", "w") as f:
+            json.dump({"url": url, "params": {str(key): str(value) for key, value in params.items()}}, f, indent=4)
+
+        with open(path + ".body.tmp", "wb") as f:
+            f.write(body)
+        os.replace(path + ".body.tmp", path + ".body")
+
+    def __len__(self):
+        if not os.path.isdir(self.directory):
+            return 0
+
+        return sum(name.endswith(".body") for name in os.listdir(self.directory))
+
+
+def recording_transport(store, transport):
+    # Transport that saves every response of transport in store
+    def record(url, params):
+        body = transport(url, params)
+        store.save(url, params, body)
+
+        return body
+
+    return record
+
+
+def replay_transport(store):
+    # Transport that answers only from store
+    return store.load
+
+
+def server_transport(base_url, transport):
+    # Transport that sends requests meant for stats.nba.com to base_url, e.g. a local ReplayServer
+    def redirect(url, params):
+        path = urllib.parse.urlparse(url).path
+
+        return transport(base_url.rstrip("/") + path, params)
+
+    return redirect
+
+
+class ReplayServer:
+    # Local stand-in for stats.nba.com serving recorded responses over HTTP in a background thread.
+    # Every response is delayed by latency seconds, requests over rate per second get 429 like the real API,
+    # unknown requests get 404.
+
+    def __init__(self, store, host="127.0.0.1", port=0, latency=0.0, rate=None, burst=10):
+        self.store = store
+        self.latency = latency
+        self.limiter = RateLimiter(rate, burst) if rate else None
+
+        self.requests = 0
+        self.throttled = 0
+        self.missing = 0
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                params = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+
+                status, body = server.respond(url.path, params)
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def respond(self, path, params):
+        with self._lock:
+            self.requests += 1
+
+        if self.limiter is not None and not self.limiter.try_acquire():
+            with self._lock:
+                self.throttled += 1
+
+            return 429, b'{"message": "Too Many Requests"}'
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        try:
+            return 200, self.store.load(path, params)
+        except FixtureMissing:
+            with self._lock:
+                self.missing += 1
+
+            return 404, b'{"message": "Not Found"}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def record_synthetic(store, n_seasons, season_types=("Regular Season", "Playoffs"), league=None):
+    # Record the responses generate_dataset and generate_features request, answered by a synthetic league
+    import get_data
+
+    from synthetic_data import SyntheticLeague, season_names
+    from generate_data import LeagueTables
+
+    league = league or SyntheticLeague()
+    transport, cache = get_data.transport, get_data.cache
+    get_data.transport = recording_transport(store, league.transport)
+    get_data.configure_cache(enabled=False)
+
+    try:
+        for season_type in season_types:
+            for season in season_names(n_seasons) + [get_data.current_season]:
+                get_data.get_player_points(season, season_type)
+                get_data.get_player_shooting(season, season_type)
+                get_data.get_team_opponent_shooting(season, season_type)
+                get_data.get_team_results(season, season_type)
+
+            LeagueTables().prefetch(season_type).feature_tables(season_type)
+    finally:
+        get_data.transport, get_data.cache = transport, cache
+
+
+if __name__ == "__main__":
+    # Create command line parser
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    # Add command line arguments
+    serve = subparsers.add_parser('serve', help='Serve recorded responses over HTTP')
+    serve.add_argument('--fixtures', default=default_fixture_dir, help='Directory with recorded responses')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8080)
+    serve.add_argument('--latency', type=float, default=0.0, help='Seconds every response is delayed')
+    serve.add_argument('--rate', type=float, help='Requests per second served, more are answered with 429')
+    serve.add_argument('--burst', type=int, default=10, help='Requests served at once before --rate applies')
+
+    synthetic = subparsers.add_parser('synthetic', help='Record responses of a synthetic league')
+    synthetic.add_argument('--fixtures', default=default_fixture_dir, help='Directory for recorded responses')
+    synthetic.add_argument('--seasons', type=int, default=4, help='Completed seasons to record')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    store = FixtureStore(args.fixtures)
+
+    if args.command == 'synthetic':
+        record_synthetic(store, args.seasons)
+        print(f"{len(store)} responses in {args.fixtures}")
+
+    else:
+        with ReplayServer(store, args.host, args.port, args.latency, args.rate, args.burst) as server:
+            print(f"Serving {len(store)} responses from {args.fixtures} on {server.url}")
+
+            try:
+                while True:
+                    time.sleep(60)
+            except KeyboardInterrupt:
+                pass
+
+            print(f"{server.requests} requests, {server.throttled} throttled, {server.missing} missing")
@@ -1,61 +1,223 @@
 import os
+import json
 import argparse
 import warnings
+import multiprocessing
 import pandas as pd
 import numpy as np
-from evidently.dashboard import Dashboard
-from evidently.tabs import RegressionPerformanceTab
 
-from model import load_model, prepare_dataset, predict_points, split_features_and_labels
-from generate_data import get_dataset
+from concurrent.futures import ProcessPoolExecutor
 
+from matrix_cache import prepared_matrix
+from inference import predict_points
+from registry import registry
+from generate_data import find_dataset
 
-def main(season_type):
-    # Load model and dataset
-    model = load_model(f'data/nba_predictor_{season_type}')
-    dataset = get_dataset(f'data/nba_dataset_{season_type}.csv')
-    dataset = prepare_dataset(dataset)
-    features, labels = split_features_and_labels(dataset)
 
-    # Add predictions
-    predictions = predict_points(model, features)
-    predictions = np.squeeze(np.asarray(predictions))           # Convert Nx1 matrix to array
+# Columns the errors are broken down by
+breakdowns = {'player': 'PLAYER_NAME', 'team': 'TEAM_NAME', 'season': 'SEASON_YEAR'}
 
-    # Append predictions and labels
-    df = features.copy()
-    df['Scored'] = labels
-    df['Prediction'] = pd.Series(predictions)
-    
+# Error quantiles in the report
+quantiles = [0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+
+class ErrorHistogram:
+    # Counts of errors in fixed bins of bin_width points, so quantiles of any number of errors take constant memory.
+    # Quantiles are exact up to bin_width, errors outside [low, high) are counted in the first or last bin.
+    def __init__(self, low=-100.0, high=100.0, bin_width=0.01):
+        self.edges = np.linspace(low, high, int(round((high - low) / bin_width)) + 1)
+        self.counts = np.zeros(self.edges.shape[0] - 1, dtype=np.int64)
+
+    def update(self, errors):
+        bins = np.clip(np.searchsorted(self.edges, errors, side='right') - 1, 0, self.counts.shape[0] - 1)
+        self.counts += np.bincount(bins, minlength=self.counts.shape[0])
+
+    def quantile(self, q):
+        # Linear interpolation inside the bin holding the q-th error
+        cumulative = np.cumsum(self.counts)
+        rank = q * cumulative[-1]
+        i = min(int(np.searchsorted(cumulative, rank)), self.counts.shape[0] - 1)
+        below = cumulative[i] - self.counts[i]
+        within = (rank - below) / self.counts[i] if self.counts[i] > 0 else 0.0
+
+        return float(self.edges[i] + within * (self.edges[i + 1] - self.edges[i]))
+
+
+class RegressionMetrics:
+    # Regression metrics accumulated chunk by chunk: sums for MAE, RMSE, bias and R2, histograms for
+    # error quantiles and per group sums for every breakdown. Error is prediction - scored points.
+    def __init__(self):
+        self.n = 0
+        self.sums = {'abs_error': 0.0, 'squared_error': 0.0, 'error': 0.0, 'scored': 0.0, 'squared_scored': 0.0}
+        self.errors = ErrorHistogram()
+        self.abs_errors = ErrorHistogram(0.0, 100.0)
+        self.groups = {name: None for name in breakdowns}
+
+    def update(self, scored, predicted, ids):
+        scored = np.asarray(scored, dtype=np.float64)
+        error = np.asarray(predicted, dtype=np.float64) - scored
+
+        self.n += error.shape[0]
+        self.sums['abs_error'] += np.abs(error).sum()
+        self.sums['squared_error'] += np.square(error).sum()
+        self.sums['error'] += error.sum()
+        self.sums['scored'] += scored.sum()
+        self.sums['squared_scored'] += np.square(scored).sum()
+
+        self.errors.update(error)
+        self.abs_errors.update(np.abs(error))
+
+        chunk = pd.DataFrame({'rows': 1, 'abs_error': np.abs(error), 'squared_error': np.square(error), 'error': error}, index=ids.index)
+
+        for name, column in breakdowns.items():
+            sums = chunk.groupby(ids[column].astype(str).values).sum()
+            self.groups[name] = sums if self.groups[name] is None else self.groups[name].add(sums, fill_value=0)
+
+    def summary(self):
+        total_variance = self.sums['squared_scored'] - self.sums['scored'] ** 2 / self.n
+
+        ret = {
+            'rows': self.n,
+            'mae': self.sums['abs_error'] / self.n,
+            'rmse': np.sqrt(self.sums['squared_error'] / self.n),
+            'mean_error': self.sums['error'] / self.n,
+            'r2': 1 - self.sums['squared_error'] / total_variance if total_variance > 0 else float('nan'),
+            'error_quantiles': {str(q): self.errors.quantile(q) for q in quantiles},
+            'abs_error_quantiles': {str(q): self.abs_errors.quantile(q) for q in quantiles}
+        }
+
+        return {k: float(v) if isinstance(v, (float, np.floating)) else v for k, v in ret.items()}
+
+    def breakdown(self, name):
+        # MAE, RMSE and mean error of every group, worst MAE first
+        sums = self.groups[name]
+
+        df = pd.DataFrame({
+            'rows': sums['rows'].astype(np.int64),
+            'mae': sums['abs_error'] / sums['rows'],
+            'rmse': np.sqrt(sums['squared_error'] / sums['rows']),
+            'mean_error': sums['error'] / sums['rows']
+        })
+        df.index.name = breakdowns[name]
+
+        return df.sort_values('mae', ascending=False)
+
+
+class RowSample:
+    # Uniform sample of at most size rows of a stream of chunks: every row gets a random priority
+    # and the rows with the lowest priorities so far are kept
+    def __init__(self, size=10000, seed=0):
+        self.size = size
+        self.random = np.random.RandomState(seed)
+        self.rows = None
+        self.priorities = np.empty(0)
+
+    def update(self, df):
+        rows = df if self.rows is None else pd.concat([self.rows, df], ignore_index=True)
+        priorities = np.concatenate([self.priorities, self.random.random_sample(df.shape[0])])
+
+        keep = np.sort(np.argsort(priorities, kind='stable')[:self.size])
+        self.rows = rows.iloc[keep].reset_index(drop=True)
+        self.priorities = priorities[keep]
+
+
+def save_dashboard(sample, features, dst):
     # Column mapping
     column_mapping = {
         'target': 'Scored',
         'prediction': 'Prediction',
         'id': None,
-        'numerical_features': features.columns
+        'numerical_features': features
     }
 
-    # Generate model performance report as HTML file
+    # Generate model performance report as HTML file, evidently is only needed here
+    from evidently.dashboard import Dashboard
+    from evidently.tabs import RegressionPerformanceTab
+
     model_performance = Dashboard(tabs=[RegressionPerformanceTab])
-    model_performance.calculate(df, None, column_mapping=column_mapping)
-    model_performance.save(f"data/performance_report_{season_type}.html")
+    model_performance.calculate(sample, None, column_mapping=column_mapping)
+    model_performance.save(dst)
+
+
+def main(season_type, chunk_size=65536, sample_size=10000, dashboard=True, models=None, min_minutes=23):
+    # Model performance on the cached prepared matrix of a dataset, predicted chunk_size rows at a time, so memory does not grow with the dataset.
+    # Metrics and breakdowns are saved as data/performance_{season_type}*, the HTML dashboard shows a sample of sample_size rows.
+    if models is not None:
+        registry.directory = models
+
+    model = registry.get(season_type)
+    matrix = prepared_matrix(find_dataset(f'data/nba_dataset_{season_type}'), min_minutes)
+    n_rows = matrix.x.shape[0]
+
+    if n_rows == 0:
+        raise ValueError(f"No rows of the {season_type} dataset played over {min_minutes} minutes")
+
+    metrics = RegressionMetrics()
+    sample = RowSample(sample_size)
+
+    for start in range(0, n_rows, chunk_size):
+        rows = slice(start, start + chunk_size)
+        x, y = np.asarray(matrix.x[rows]), np.asarray(matrix.y[rows])
+
+        # Add predictions, Nx1 matrix to array
+        predictions = np.asarray(predict_points(model, x)).reshape(-1)
+
+        ids = pd.DataFrame({
+            'PLAYER_NAME': pd.Categorical.from_codes(matrix.players[rows], matrix.player_names),
+            'TEAM_NAME': pd.Categorical.from_codes(matrix.teams[rows], matrix.team_names),
+            'SEASON_YEAR': pd.Categorical.from_codes(matrix.seasons[rows], matrix.season_names)
+        })
+        metrics.update(y, predictions, ids)
+
+        if dashboard:
+            sample.update(pd.DataFrame(x, columns=matrix.columns).assign(Scored=y, Prediction=predictions))
+
+    summary = metrics.summary()
+
+    with open(f"data/performance_{season_type}.json", "w") as f:
+        json.dump(summary, f, indent=4)
+
+    for name in breakdowns:
+        metrics.breakdown(name).to_csv(f"data/performance_{season_type}_by_{name}.csv")
+
+    if dashboard:
+        save_dashboard(sample.rows, matrix.columns, f"data/performance_report_{season_type}.html")
+
+    return summary
 
 
 if __name__ == "__main__":
-    # Ignore WARNINGs 
+    # Ignore WARNINGs
     warnings.filterwarnings('ignore')
-    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3' 
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 
     # Create command line parser
     parser = argparse.ArgumentParser()
 
     # Add command line arguments
-    parser.add_argument('--season_type', help='Regular Season or Playoffs')
+    parser.add_argument('--season_type', help='Regular Season or Playoffs, both in parallel by default')
+    parser.add_argument('--chunk-size', type=int, default=65536, help='Dataset rows predicted at once')
+    parser.add_argument('--sample-size', type=int, default=10000, help='Rows shown in the HTML dashboard')
+    parser.add_argument('--no-dashboard', action='store_true', help='Only save metrics and breakdowns')
+    parser.add_argument('--models', help='Directory with nba_predictor_* models, data by default')
 
     # Parse arguments
     args = parser.parse_args()
 
-    # Season type dataset
-    season_type = args.season_type.replace(" ", "").lower()
+    # Season type datasets
+    season_types = ["Regular Season", "Playoffs"] if args.season_type is None else [args.season_type]
+    season_types = [season_type.replace(" ", "").lower() for season_type in season_types]
+
+    # Run main, one process per season type
+    context = multiprocessing.get_context('spawn')
+
+    with ProcessPoolExecutor(max_workers=len(season_types), mp_context=context) as executor:
+        futures = [executor.submit(main, season_type, args.chunk_size, args.sample_size, not args.no_dashboard, args.models) for season_type in season_types]
+        results = [future.result() for future in futures]
 
-    # Run main
-    main(season_type)
+    print(f"{'season type':<16}{'rows':>10}{'MAE':>8}{'RMSE':>8}{'bias':>8}{'R2':>8}{'p50 |e|':>9}{'p95 |e|':>9}")
+    for season_type, r in zip(season_types, results):
+        print(
+            f"{season_type:<16}{r['rows']:>10}{r['mae']:>8.3f}{r['rmse']:>8.3f}{r['mean_error']:>8.3f}{r['r2']:>8.3f}"
+            f"{r['abs_error_quantiles']['0.5']:>9.3f}{r['abs_error_quantiles']['0.95']:>9.3f}"
+        )
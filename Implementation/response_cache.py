@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class OfflineCacheMiss(LookupError):
+    # Raised in offline mode when a response is not in the cache
+    pass
+
+
+class ResponseCache:
+    # Persistent cache of raw stats.nba.com responses keyed on (url, normalized params).
+    # Responses of completed seasons never expire, responses of the current season expire after ttl seconds
+    # and the least recently used responses are evicted once the cache grows over max_bytes.
+
+    def __init__(self, path, current_season, ttl=6 * 60 * 60, max_bytes=2 * 1024 ** 3, offline=False):
+        self.path = path
+        self.current_season = current_season
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        self.bytes_downloaded = 0
+
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self):
+        # Database is opened on first use, so importing get_data does not touch the disk
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    permanent INTEGER NOT NULL
+                )
+                """
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+            self._connection.commit()
+
+        return self._connection
+
+    @staticmethod
+    def normalize_params(params):
+        return json.dumps({str(key): str(value) for key, value in params.items()}, sort_keys=True)
+
+    def key(self, url, params):
+        return hashlib.sha256(f"{url}?{self.normalize_params(params)}".encode()).hexdigest()
+
+    def is_permanent(self, params):
+        # Past seasons never change
+        season = params.get("Season")
+        return season is not None and str(season) != self.current_season
+
+    def lookup(self, url, params):
+        key = self.key(url, params)
+
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT body, fetched_at, permanent FROM responses WHERE key = ?", (key,)).fetchone()
+
+            if row is None:
+                return None
+
+            body, fetched_at, permanent = row
+
+            # Expired responses are still served when there is no way to refresh them
+            if not permanent and not self.offline and time.time() - fetched_at > self.ttl:
+                return None
+
+            connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            connection.commit()
+
+        return bytes(body)
+
+    def store(self, url, params, body):
+        now = time.time()
+
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.key(url, params), url, self.normalize_params(params), sqlite3.Binary(body), len(body), now, now, int(self.is_permanent(params)))
+            )
+            self._evict(connection)
+            connection.commit()
+
+    def _evict(self, connection):
+        # Drop least recently used responses until the cache fits into max_bytes
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+        for key, size in connection.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+            if total <= self.max_bytes:
+                break
+
+            connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def fetch(self, url, params, transport):
+        # Return the raw response body, calling transport(url, params) only on a cache miss
+        body = self.lookup(url, params)
+
+        if body is not None:
+            with self._lock:
+                self.hits += 1
+                self.bytes_served += len(body)
+
+            return body
+
+        if self.offline:
+            raise OfflineCacheMiss(f"{url} with {self.normalize_params(params)} is not cached")
+
+        body = transport(url, params)
+
+        with self._lock:
+            self.misses += 1
+            self.bytes_downloaded += len(body)
+
+        self.store(url, params, body)
+
+        return body
+
+    def clear(self):
+        with self._lock:
+            connection = self._connect()
+            connection.execute("DELETE FROM responses")
+            connection.commit()
+
+    def size(self):
+        with self._lock:
+            return self._connect().execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes_served": self.bytes_served,
+                "bytes_downloaded": self.bytes_downloaded
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.bytes_served = 0
+            self.bytes_downloaded = 0
@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import asyncio
+import argparse
+import warnings
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ThreadPoolExecutor
+
+from generate_data import LeagueTables
+from feature_store import FeatureStore
+from batch import slate_columns, predict_slate
+from registry import registry
+
+
+# Reason phrases of the statuses the service answers with
+reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 422: "Unprocessable Entity", 500: "Internal Server Error"}
+
+season_types = ["Regular Season", "Playoffs"]
+
+
+class InvalidGame(ValueError):
+    pass
+
+
+class UnknownGame(LookupError):
+    pass
+
+
+class MicroBatcher:
+    # Collects concurrent requests into batches of up to max_batch_size games, waiting at most max_wait seconds
+    # after the first one, and runs predict(games) -> predictions once per batch in a worker thread,
+    # so the event loop keeps accepting requests while a batch is computed. Batches are predicted one after
+    # another: requests arriving during a batch wait in the queue and form the next one, so under load batches
+    # grow instead of competing for the CPU, and one worker thread is all the executor needs.
+
+    def __init__(self, predict, max_batch_size=64, max_wait=0.005, executor=None):
+        self.predict = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.executor = executor
+
+        self.batches = 0
+        self.requests = 0
+        self._queue = None
+
+    async def submit(self, game):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((game, future))
+
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            games = pd.DataFrame([game for game, _ in batch], columns=slate_columns)
+
+            try:
+                predictions = await loop.run_in_executor(self.executor, self.predict, games)
+            except Exception as e:
+                predictions = [e] * len(batch)
+
+            self.batches += 1
+            self.requests += len(batch)
+
+            for (_, future), prediction in zip(batch, predictions):
+                if future.done():
+                    continue
+
+                if isinstance(prediction, Exception):
+                    future.set_exception(prediction)
+                else:
+                    future.set_result(prediction)
+
+
+class PredictionService:
+    # Asyncio HTTP/1.1 endpoint for predictions:
+    #   POST /predict with a game {"player", "team", "opponent", "season_type", "home_game", "b2b"} or a list of games
+    #   GET /health with batching counters
+    # Concurrent requests are predicted together in micro-batches, features of a batch come from the feature store
+    # or from league tables shared by every request and renewed every tables_ttl seconds. A league table whose
+    # request failed is requested again by the next batch, so a transient error only fails the batch it happened in.
+    # Statuses: 400 for a body that is not JSON or not a valid game, 422 for an unknown player or team, 500 otherwise.
+
+    def __init__(self, max_batch_size=64, max_wait=0.005, store=None, tables_ttl=60 * 60):
+        self.store = store
+        self.tables_ttl = tables_ttl
+        self.batcher = MicroBatcher(self.predict, max_batch_size, max_wait, ThreadPoolExecutor(max_workers=1))
+
+        self._tables = None
+        self._tables_created = 0
+
+    @property
+    def tables(self):
+        if self._tables is None or time.monotonic() - self._tables_created > self.tables_ttl:
+            self._tables = LeagueTables()
+            self._tables_created = time.monotonic()
+
+        return self._tables
+
+    def predict(self, games):
+        # Predictions of a batch of games in their order, NaN for unknown players or teams
+        predictions = pd.concat(list(predict_slate(games, self.tables, self.store)))
+
+        return predictions['predicted_points'].reindex(games.index).tolist()
+
+    @staticmethod
+    def parse_game(game):
+        if not isinstance(game, dict):
+            raise InvalidGame("A game must be a JSON object")
+
+        missing = [column for column in ['player', 'team', 'opponent', 'season_type', 'home_game'] if column not in game]
+        if missing:
+            raise InvalidGame(f"Missing {', '.join(missing)}")
+
+        if game['season_type'] not in season_types:
+            raise InvalidGame(f"season_type must be one of {', '.join(season_types)}")
+
+        try:
+            return [str(game['player']), str(game['team']), str(game['opponent']), game['season_type'], int(game['home_game']), int(game.get('b2b', 0))]
+        except (TypeError, ValueError):
+            raise InvalidGame("home_game and b2b must be 0 or 1")
+
+    async def predict_game(self, game):
+        pts = await self.batcher.submit(self.parse_game(game))
+
+        if np.isnan(pts):
+            raise UnknownGame(f"Unknown player or team in {game}")
+
+        return {'predicted_points': float(pts)}
+
+    async def route(self, method, path, body):
+        if path == "/health":
+            return 200, {'status': 'ok', 'batches': self.batcher.batches, 'requests': self.batcher.requests}
+
+        if path != "/predict":
+            return 404, {'error': f"Unknown path {path}"}
+
+        if method != "POST":
+            return 405, {'error': "Use POST"}
+
+        try:
+            games = json.loads(body)
+        except ValueError as e:
+            # Not JSON, or not UTF-8
+            return 400, {'error': str(e)}
+
+        try:
+            if isinstance(games, list):
+                return 200, await asyncio.gather(*[self.predict_game(game) for game in games])
+
+            return 200, await self.predict_game(games)
+
+        except InvalidGame as e:
+            return 400, {'error': str(e)}
+        except UnknownGame as e:
+            return 422, {'error': str(e)}
+        except Exception as e:
+            return 500, {'error': repr(e)}
+
+    async def handle(self, reader, writer):
+        # One keep-alive connection, requests are answered in order
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                method, path = request_line.decode().split()[:2]
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+
+                    name, value = line.decode().split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, payload = await self.route(method, path, body)
+
+                data = json.dumps(payload).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                writer.write(
+                    f"HTTP/1.1 {status} {reasons[status]}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8000):
+        server = await asyncio.start_server(self.handle, host, port)
+        batcher = asyncio.ensure_future(self.batcher.run())
+
+        print(f"Serving predictions on http://{host}:{port}/predict")
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+if __name__ == "__main__":
+    # Ignore WARNINGs
+    warnings.filterwarnings('ignore')
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
+
+    # Create command line parser
+    parser = argparse.ArgumentParser()
+
+    # Add command line arguments
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-batch-size', type=int, default=64, help='Most games predicted in one forward pass')
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help='Longest a request waits for others to join its batch')
+    parser.add_argument('--models', help='Directory with nba_predictor_* models, data by default')
+    parser.add_argument('--no-feature-store', action='store_true', help='Always generate features from live league tables')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    if args.models is not None:
+        registry.directory = args.models
+
+    service = PredictionService(args.max_batch_size, args.max_wait_ms / 1000, None if args.no_feature_store else FeatureStore())
+
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
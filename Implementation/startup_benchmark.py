@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+
+# Modules every entry point is timed for
+entry_points = ['main', 'report', 'batch', 'service', 'inference', 'model']
+
+# Modules an entry point must not import, they are only needed for training, tuning or plotting
+forbidden_imports = {
+    'main': ['keras_tuner', 'seaborn', 'matplotlib', 'evidently', 'tensorflow'],
+    'report': ['keras_tuner', 'seaborn', 'matplotlib', 'evidently', 'tensorflow'],
+    'batch': ['keras_tuner', 'seaborn', 'matplotlib', 'evidently', 'tensorflow'],
+    'service': ['keras_tuner', 'seaborn', 'matplotlib', 'evidently', 'tensorflow'],
+    'inference': ['keras_tuner', 'seaborn', 'matplotlib', 'evidently', 'tensorflow', 'pandas']
+}
+
+# Runs in a fresh interpreter, so nothing is imported yet
+child = """
+import sys
+import json
+import time
+import resource
+
+start = time.perf_counter()
+error = None
+
+try:
+    import {module}
+except Exception as e:
+    error = repr(e)
+
+seconds = time.perf_counter() - start
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+peak_rss_mb = maxrss / 1024 ** 2 if sys.platform == "darwin" else maxrss / 1024
+
+print(json.dumps({{"seconds": seconds, "peak_rss_mb": peak_rss_mb, "error": error, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure(module, repeat=3):
+    # Best import time and peak RSS of importing module in a new process
+    directory = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", child.format(module=module)], cwd=directory, capture_output=True, text=True, check=True)
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    best = min(runs, key=lambda run: run['seconds'])
+    imported = {name.split('.')[0] for name in best['modules']}
+
+    return {
+        'module': module,
+        'seconds': best['seconds'],
+        'peak_rss_mb': max(run['peak_rss_mb'] for run in runs),
+        'error': best['error'],
+        'forbidden': sorted(imported.intersection(forbidden_imports.get(module, [])))
+    }
+
+
+if __name__ == "__main__":
+    # Create command line parser
+    parser = argparse.ArgumentParser()
+
+    # Add command line arguments
+    parser.add_argument('modules', nargs='*', default=entry_points, help='Modules to import, all entry points by default')
+    parser.add_argument('--repeat', type=int, default=3, help='Imports per module, the fastest is reported')
+    parser.add_argument('--json', help='Save results to this JSON file')
+    parser.add_argument('--check', action='store_true', help='Fail if an entry point cannot be imported or imports a training, tuning or plotting dependency')
+
+    # Parse arguments
+    args = parser.parse_args()
+
+    results = [measure(module, args.repeat) for module in args.modules]
+
+    print(f"{'module':<12}{'import s':>10}{'peak RSS MB':>14}  forbidden imports / error")
+    for result in results:
+        note = ", ".join(result['forbidden']) or (result['error'] or "")
+        print(f"{result['module']:<12}{result['seconds']:>10.3f}{result['peak_rss_mb']:>14.1f}  {note}")
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+
+    # A failed import stops early, so its module list says nothing about what the entry point imports
+    if args.check and any(result['error'] for result in results):
+        raise SystemExit("Entry points cannot be imported")
+
+    if args.check and any(result['forbidden'] for result in results):
+        raise SystemExit("Entry points import training, tuning or plotting dependencies")
@@ -0,0 +1,243 @@
+import json
+import threading
+import numpy as np
+import pandas as pd
+
+from get_data import abbreviations
+
+
+# 30 current teams, New Orleans Hornets are the Pelicans' old name
+team_abbreviations = [abbreviation for abbreviation in abbreviations if abbreviation != "NOH"]
+
+first_names = ["James", "Kevin", "Luka", "Jayson", "Devin", "Trae", "Zion", "Damian", "Bradley", "Jimmy",
+               "Anthony", "Chris", "Paul", "Kyle", "Jrue", "Donovan", "Jaylen", "Karl", "Zach", "Nikola",
+               "De'Aaron", "Shai", "Domantas", "Bam", "Tyler"]
+last_names = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Miller", "Davis", "Wilson", "Anderson", "Thomas",
+              "Taylor", "Moore", "Jackson", "Martin", "Lee", "Thompson", "White", "Harris", "Clark", "Lewis",
+              "Walker", "Young", "Allen", "King", "Wright"]
+
+distances = ["Less Than 5 ft.", "5-9 ft.", "10-14 ft.", "15-19 ft.", "20-24 ft.", "25-29 ft.", "30-34 ft.", "35-39 ft.", "40+ ft."]
+
+player_log_columns = ["SEASON_YEAR", "PLAYER_ID", "PLAYER_NAME", "TEAM_ID", "TEAM_ABBREVIATION", "TEAM_NAME", "GAME_ID",
+                      "GAME_DATE", "MATCHUP", "WL", "MIN", "FGM", "FGA", "REB", "AST", "PTS", "PLUS_MINUS"]
+team_log_columns = ["SEASON_YEAR", "TEAM_ID", "TEAM_ABBREVIATION", "TEAM_NAME", "GAME_ID", "GAME_DATE", "MATCHUP", "WL",
+                    "MIN", "OFF_RATING", "DEF_RATING", "NET_RATING", "PACE"]
+
+
+def season_names(n_seasons, last="2020-21"):
+    # n_seasons season names ending with last, most recent first, e.g. ["2020-21", "2019-20"]
+    year = int(last[:4])
+
+    return [f"{y}-{(y + 1) % 100:02d}" for y in range(year, year - n_seasons, -1)]
+
+
+class SyntheticLeague:
+    # Fake stats.nba.com: 30 teams and players_per_team players, playing 82 games per team in the regular season
+    # and 10 rounds of 16 teams in the playoffs. transport(url, params) answers the endpoints used by get_data
+    # with responses shaped like the real ones, so everything built on get_data runs offline.
+
+    def __init__(self, players_per_team=17, seed=0):
+        self.players_per_team = players_per_team
+        self.seed = seed
+
+        self._logs = {}
+        self._lock = threading.Lock()
+
+        n_players = len(team_abbreviations) * players_per_team
+        self.player_names = np.array([f"{first_names[p % len(first_names)]} {last_names[p // len(first_names) % len(last_names)]}"
+                                      + ("" if p < len(first_names) * len(last_names) else f" {p // (len(first_names) * len(last_names)) + 1}")
+                                      for p in range(n_players)])
+
+        # Players have a scoring rate and a role, teams a strength, pace and rating, kept over seasons
+        rng = np.random.default_rng(seed)
+        self.scoring = rng.gamma(4.0, 0.1, n_players)
+        self.strength = rng.normal(0, 1, len(team_abbreviations))
+        self.pace = rng.normal(100, 3, len(team_abbreviations))
+        self.rating = rng.normal(110, 3, len(team_abbreviations))
+
+    def logs(self, season, season_type):
+        # Player and team game logs of a season, generated once
+        key = (season, season_type)
+
+        with self._lock:
+            if key not in self._logs:
+                self._logs[key] = self._generate_logs(season, season_type)
+
+            return self._logs[key]
+
+    def _generate_logs(self, season, season_type):
+        year = int(season[:4])
+        playoffs = season_type == "Playoffs"
+        rng = np.random.default_rng([self.seed, year, int(playoffs)])
+        n_teams = len(team_abbreviations)
+
+        # Schedule: every round all teams (16 best in the playoffs) are paired randomly, a round takes about two days
+        teams = np.argsort(-self.strength)[:16] if playoffs else np.arange(n_teams)
+        n_rounds = 10 if playoffs else 82
+        start = pd.Timestamp(f"{year}-04-20" if playoffs else f"{year}-10-20")
+
+        pairs = np.concatenate([rng.permutation(teams).reshape(-1, 2) for _ in range(n_rounds)])
+        rounds = np.repeat(np.arange(n_rounds), teams.shape[0] // 2)
+        n_games = pairs.shape[0]
+        days = (rounds * 2 + rng.integers(0, 2, n_games)) if playoffs else (rounds * 165 // 82 + rng.integers(0, 3, n_games))
+        dates = (start + pd.to_timedelta(days, unit="D")).strftime("%Y-%m-%dT00:00:00").to_numpy()
+        game_ids = np.array([f"00{4 if playoffs else 2}{year % 100:02d}{i + 1:05d}" for i in range(n_games)])
+
+        # Home team first, every game gives one row per team
+        home, away = pairs[:, 0], pairs[:, 1]
+        home_win = rng.random(n_games) < 1 / (1 + np.exp(-(self.strength[home] - self.strength[away] + 0.3)))
+        pace = (self.pace[home] + self.pace[away]) / 2 + rng.normal(0, 3, n_games)
+        home_rating = self.rating[home] + rng.normal(0, 8, n_games)
+        away_rating = self.rating[away] + rng.normal(0, 8, n_games)
+
+        team = np.concatenate([home, away])
+        opponent = np.concatenate([away, home])
+        is_home = np.repeat([True, False], n_games)
+        win = np.concatenate([home_win, ~home_win])
+        off_rating = np.concatenate([home_rating, away_rating]).round(1)
+        def_rating = np.concatenate([away_rating, home_rating]).round(1)
+
+        abbreviation = np.array(team_abbreviations)
+        names = np.array([abbreviations[a] for a in team_abbreviations])
+        matchup = np.where(is_home, np.char.add(np.char.add(abbreviation[team], " vs. "), abbreviation[opponent]),
+                           np.char.add(np.char.add(abbreviation[team], " @ "), abbreviation[opponent]))
+
+        team_logs = pd.DataFrame({
+            "SEASON_YEAR": season,
+            "TEAM_ID": 1610612737 + team,
+            "TEAM_ABBREVIATION": abbreviation[team],
+            "TEAM_NAME": names[team],
+            "GAME_ID": np.tile(game_ids, 2),
+            "GAME_DATE": np.tile(dates, 2),
+            "MATCHUP": matchup,
+            "WL": np.where(win, "W", "L"),
+            "MIN": 240,
+            "OFF_RATING": off_rating,
+            "DEF_RATING": def_rating,
+            "NET_RATING": (off_rating - def_rating).round(1),
+            "PACE": np.tile(pace, 2).round(2)
+        })
+
+        # Every player of a team plays 80% of its games, starters (first five of a roster) play more minutes.
+        # A third of players move to the next team every season.
+        players = np.arange(self.player_names.shape[0])
+        player_team = (players + (players % 3 == 0) * (year % n_teams)) % n_teams
+        roster = [players[player_team == t] for t in range(n_teams)]
+
+        rows = np.concatenate([np.repeat(np.arange(team.shape[0]), [roster[t].shape[0] for t in team])])
+        player = np.concatenate([roster[t] for t in team])
+        starter = np.concatenate([np.arange(roster[t].shape[0]) < 5 for t in team])
+
+        played = rng.random(player.shape[0]) < 0.8
+        rows, player, starter = rows[played], player[played], starter[played]
+
+        minutes = np.clip(np.where(starter, rng.normal(32, 4, player.shape[0]), rng.normal(16, 6, player.shape[0])), 1, 48).round(2)
+        points = rng.poisson(self.scoring[player] * minutes)
+        fga = rng.poisson(points * 0.8) + rng.integers(0, 3, player.shape[0])
+
+        player_logs = pd.DataFrame({
+            "SEASON_YEAR": season,
+            "PLAYER_ID": 200000 + player,
+            "PLAYER_NAME": self.player_names[player],
+            "TEAM_ID": team_logs["TEAM_ID"].to_numpy()[rows],
+            "TEAM_ABBREVIATION": team_logs["TEAM_ABBREVIATION"].to_numpy()[rows],
+            "TEAM_NAME": team_logs["TEAM_NAME"].to_numpy()[rows],
+            "GAME_ID": team_logs["GAME_ID"].to_numpy()[rows],
+            "GAME_DATE": team_logs["GAME_DATE"].to_numpy()[rows],
+            "MATCHUP": team_logs["MATCHUP"].to_numpy()[rows],
+            "WL": team_logs["WL"].to_numpy()[rows],
+            "MIN": minutes,
+            "FGM": np.minimum(fga, points // 2),
+            "FGA": fga,
+            "REB": rng.poisson(minutes / 6),
+            "AST": rng.poisson(minutes / 10),
+            "PTS": points,
+            "PLUS_MINUS": rng.integers(-20, 21, player.shape[0])
+        })
+
+        # Game logs are returned newest first
+        team_logs = team_logs.sort_values("GAME_DATE", ascending=False, kind="mergesort", ignore_index=True)
+        player_logs = player_logs.sort_values("GAME_DATE", ascending=False, kind="mergesort", ignore_index=True)
+
+        return player_logs, team_logs
+
+    @staticmethod
+    def _filter(logs, params):
+        # DateFrom (MM/DD/YYYY) and LastNGames parameters of game log endpoints
+        if str(params.get("DateFrom", "")):
+            logs = logs[logs["GAME_DATE"] >= pd.to_datetime(params["DateFrom"], format="%m/%d/%Y").strftime("%Y-%m-%dT00:00:00")]
+
+        return logs
+
+    def response(self, url, params):
+        # Decoded JSON response of an endpoint
+        endpoint = url.rsplit("/", 1)[-1]
+        player_logs, team_logs = self.logs(params["Season"], params["SeasonType"])
+        last_n_games = int(params.get("LastNGames", 0))
+
+        if endpoint == "playergamelogs":
+            return result_sets(self._filter(player_logs, params)[player_log_columns])
+
+        if endpoint == "teamgamelogs":
+            return result_sets(self._filter(team_logs, params)[team_log_columns])
+
+        if endpoint == "leaguedashteamstats":
+            logs = team_logs.groupby("TEAM_ID", sort=True).head(last_n_games) if last_n_games > 0 else team_logs
+            logs = logs.assign(W=logs["WL"] == "W")
+            stats = logs.groupby(["TEAM_ID", "TEAM_NAME"], sort=True).agg(
+                GP=("W", "size"), W=("W", "sum"), OFF_RATING=("OFF_RATING", "mean"), DEF_RATING=("DEF_RATING", "mean"), PACE=("PACE", "mean")
+            ).reset_index()
+            stats.insert(3, "L", stats["GP"] - stats["W"])
+            stats.insert(5, "W_PCT", (stats["W"] / stats["GP"]).round(3))
+
+            return result_sets(stats.round(1))
+
+        rng = np.random.default_rng([self.seed, int(params["Season"][:4]), len(endpoint)])
+
+        if endpoint == "leaguedashplayershotlocations":
+            players = player_logs.groupby(["PLAYER_ID", "PLAYER_NAME", "TEAM_ID", "TEAM_ABBREVIATION"], sort=True)["FGA"].mean().reset_index()
+            share = rng.dirichlet(np.ones(len(distances)), players.shape[0])
+            fga = (players["FGA"].to_numpy()[:, None] * share).round(1)
+            pct = rng.uniform(0.3, 0.6, fga.shape).round(3)
+            shooting = np.stack([(fga * pct).round(1), fga, pct], axis=2).reshape(players.shape[0], -1)
+
+            rows = [ids + [25] + values for ids, values in zip(players.drop(columns="FGA").values.tolist(), shooting.tolist())]
+            columns = ["PLAYER_ID", "PLAYER_NAME", "TEAM_ID", "TEAM_ABBREVIATION", "AGE"] + ["FGM", "FGA", "FG_PCT"] * len(distances)
+
+            return shot_locations(rows, columns)
+
+        if endpoint == "leaguedashteamshotlocations":
+            teams = team_logs.groupby(["TEAM_ID", "TEAM_NAME"], sort=True).size().reset_index()[["TEAM_ID", "TEAM_NAME"]]
+            fga = rng.uniform(0.5, 30, (teams.shape[0], len(distances))).round(1)
+            pct = rng.uniform(0.3, 0.6, fga.shape).round(3)
+            shooting = np.stack([(fga * pct).round(1), fga, pct], axis=2).reshape(teams.shape[0], -1)
+
+            rows = [ids + values for ids, values in zip(teams.values.tolist(), shooting.tolist())]
+            columns = ["TEAM_ID", "TEAM_NAME"] + ["OPP_FGM", "OPP_FGA", "OPP_FG_PCT"] * len(distances)
+
+            return shot_locations(rows, columns)
+
+        raise ValueError(f"Unknown endpoint {endpoint}")
+
+    def transport(self, url, params):
+        # Drop-in replacement of get_data.transport
+        return json.dumps(self.response(url, params)).encode()
+
+
+def result_sets(df):
+    # Response of endpoints with a list of result sets (game logs, team stats)
+    return {"resultSets": [{"name": "Results", "headers": list(df.columns), "rowSet": df.values.tolist()}]}
+
+
+def shot_locations(rows, columns):
+    # Response of shot location endpoints, whose result set has two header rows
+    return {"resultSets": {
+        "name": "ShotLocations",
+        "headers": [{"name": "SHOT_CATEGORY", "columnNames": distances}, {"name": "columns", "columnNames": columns}],
+        "rowSet": rows
+    }}
+
+
+# League used when no other is given
+league = SyntheticLeague()
+transport = league.transport
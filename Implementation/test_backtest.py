@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+import backtest as backtest_module
+import get_data
+
+from backtest import backtest, fold_data, walk_forward_folds
+from dataset import prepare_dataset, split_features_and_labels
+from generate_data import generate_dataset, get_dataset
+from matrix_cache import prepared_matrix
+from synthetic_data import SyntheticLeague
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    # Regular season dataset of 3 synthetic seasons
+    dst = str(tmp_path_factory.mktemp("backtest") / "nba_dataset_regularseason.csv")
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(get_data, "cache", None)
+        monkeypatch.setattr(get_data, "transport", SyntheticLeague(players_per_team=3).transport)
+
+        generate_dataset(3, "Regular Season", dst=dst)
+
+    return dst
+
+
+@pytest.fixture(scope="module")
+def cache_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("prepared"))
+
+
+@pytest.fixture(scope="module")
+def matrix(dataset, cache_dir):
+    return prepared_matrix(dataset, cache_dir=cache_dir)
+
+
+def test_walk_forward_folds():
+    assert walk_forward_folds(4) == [(0, 1), (1, 2), (2, 3)]
+    assert walk_forward_folds(4, min_train_seasons=2) == [(1, 2), (2, 3)]
+    assert walk_forward_folds(1) == []
+    assert walk_forward_folds(3, min_train_seasons=3) == []
+
+
+def test_fold_data_are_views_of_the_seasons(dataset, matrix):
+    # Rows of every season prepared from the dataset, in the order save_matrix keeps within a season
+    df = get_dataset(dataset)
+    prepared = prepare_dataset(df)
+    seasons = df.loc[prepared.index, 'SEASON_YEAR'].astype(str).values
+    x, y = split_features_and_labels(prepared)
+
+    assert matrix.season_names == sorted(set(seasons))
+    assert list(x.columns) == matrix.columns
+
+    def rows_of(names):
+        # Seasons oldest first, rows of a season in dataset order
+        x_parts = [x[seasons == name].to_numpy(dtype=np.float32) for name in names]
+        y_parts = [y[seasons == name].to_numpy(dtype=np.float32) for name in names]
+
+        return np.concatenate(x_parts), np.concatenate(y_parts)
+
+    for last_train, test in walk_forward_folds(len(matrix.season_names)):
+        train_x, train_y, test_x, test_y = fold_data(matrix, (last_train, test))
+
+        # Slices of the memory mapped files, nothing is copied
+        for array, whole in [(train_x, matrix.x), (train_y, matrix.y), (test_x, matrix.x), (test_y, matrix.y)]:
+            assert isinstance(array, np.memmap) and np.shares_memory(array, whole)
+
+        expected_train_x, expected_train_y = rows_of(matrix.season_names[:last_train + 1])
+        expected_test_x, expected_test_y = rows_of(matrix.season_names[test:test + 1])
+
+        np.testing.assert_array_equal(train_x, expected_train_x)
+        np.testing.assert_array_equal(train_y, expected_train_y)
+        np.testing.assert_array_equal(test_x, expected_test_x)
+        np.testing.assert_array_equal(test_y, expected_test_y)
+
+
+def test_backtest_trains_every_fold(dataset, cache_dir, matrix, monkeypatch):
+    # Folds trained in spawned processes on the cached matrix
+    pytest.importorskip("tensorflow")
+    monkeypatch.setattr(backtest_module, "prepared_matrix", lambda src, min_minutes: prepared_matrix(src, min_minutes, cache_dir=cache_dir))
+
+    results = backtest(dataset, workers=2, epochs=1, patience=1)
+
+    assert [r['test_season'] for r in results] == matrix.season_names[1:]
+    assert all(r['train_rows'] > 0 and r['test_rows'] > 0 and np.isfinite(r['mae']) for r in results)
@@ -0,0 +1,227 @@
+import json
+import pandas as pd
+import pytest
+
+import get_data
+
+from feature_store import FeatureStore
+from generate_data import LeagueTables, generate_b2b, generate_dataset, generate_pg, generate_w_pct, get_dataset, set_dtypes, update_dataset
+from synthetic_data import SyntheticLeague
+
+
+# Per-row implementations the generated columns were first computed with, kept as the reference
+def baseline_generate_pg(df, column, group_by, filter_by, last_n_games=5, opp=""):
+    def filter(row):
+        df_mod = df[(df[group_by] == row[filter_by]) & (df['GAME_DATE'] < row['GAME_DATE'])]
+        return df_mod[column].mean() if df_mod.shape[0] > 0 else row[column]
+
+    def filter_last_n(row):
+        df_mod = df[(df[group_by] == row[filter_by]) & (df['GAME_DATE'] < row['GAME_DATE'])]
+        df_mod = df_mod.sort_values('GAME_DATE', ascending=False)
+        df_mod = df_mod.head(last_n_games)
+        return df_mod[column].mean() if df_mod.shape[0] > 0 else row[column]
+
+    column1 = f"{opp}{column}_PG"
+    column2 = f"{opp}LAST_{last_n_games}_{column}_PG"
+
+    df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'])
+    df[column] = pd.to_numeric(df[column])
+    df[column1] = df.apply(filter, axis=1)
+    df[column2] = df.apply(filter_last_n, axis=1)
+
+    return df
+
+
+def baseline_generate_w_pct(df, last_n_games=5, opp=""):
+    def filter(row):
+        df_mod = df[(df["TEAM_NAME"] == row["TEAM_NAME"]) & (df['GAME_DATE'] < row['GAME_DATE'])]
+        df_win = df_mod[df_mod['WL'] == 'W']
+
+        return df_win.shape[0] / df_mod.shape[0] if df_mod.shape[0] > 0 else 0.5
+
+    def filter_last_n(row):
+        df_mod = df[(df["TEAM_NAME"] == row["TEAM_NAME"]) & (df['GAME_DATE'] < row['GAME_DATE'])]
+        df_mod = df_mod.sort_values('GAME_DATE', ascending=False)
+        df_mod = df_mod.head(last_n_games)
+        df_win = df_mod[df_mod['WL'] == 'W']
+
+        return df_win.shape[0] / df_mod.shape[0] if df_mod.shape[0] > 0 else 0.5
+
+    column1 = opp + "W_PCT"
+    column2 = opp + "LAST_N_W_PCT"
+
+    df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'])
+    df[column1] = df.apply(filter, axis=1)
+    df[column2] = df.apply(filter_last_n, axis=1)
+
+    return df
+
+
+def baseline_generate_b2b(df):
+    def filter(row):
+        df_mod = df[(df['PLAYER_NAME'] == row["PLAYER_NAME"]) & (df['GAME_DATE'] < row['GAME_DATE'])]
+
+        if df_mod.shape[0] == 0:
+            return 0
+
+        last_game = df_mod['GAME_DATE'].max()
+        diff = row['GAME_DATE'] - last_game
+
+        # If games are 2 days in a row
+        return 1 if diff.days == 1 else 0
+
+    df['GAME_DATE'] = pd.to_datetime(df['GAME_DATE'])
+    df['B2B'] = df.apply(filter, axis=1)
+
+    return df
+
+
+@pytest.fixture(scope="module")
+def logs():
+    # First 50 days of a synthetic season, every player and team plays at most one game a date,
+    # so the reference's sort of earlier games has no ties
+    player_logs, team_logs = SyntheticLeague(players_per_team=2).logs("2020-21", "Regular Season")
+
+    player_logs = player_logs[player_logs["GAME_DATE"] < "2020-12-10"].drop_duplicates(["PLAYER_NAME", "GAME_DATE"], ignore_index=True)
+    team_logs = team_logs[team_logs["GAME_DATE"] < "2020-12-10"].drop_duplicates(["TEAM_NAME", "GAME_DATE"], ignore_index=True)
+
+    return player_logs, team_logs
+
+
+@pytest.mark.parametrize("column, last_n_games", [("PTS", 5), ("MIN", 3)])
+def test_player_pg_matches_baseline(logs, column, last_n_games):
+    player_logs, _ = logs
+
+    expected = baseline_generate_pg(player_logs.copy(), column, "PLAYER_NAME", "PLAYER_NAME", last_n_games)
+    result = generate_pg(player_logs.copy(), column, "PLAYER_NAME", "PLAYER_NAME", last_n_games)
+
+    for generated in [f"{column}_PG", f"LAST_{last_n_games}_{column}_PG"]:
+        pd.testing.assert_series_equal(result[generated], expected[generated])
+
+
+@pytest.mark.parametrize("column", ["OFF_RATING", "PACE"])
+def test_team_pg_matches_baseline(logs, column):
+    _, team_logs = logs
+
+    expected = baseline_generate_pg(team_logs.copy(), column, "TEAM_NAME", "TEAM_NAME")
+    result = generate_pg(team_logs.copy(), column, "TEAM_NAME", "TEAM_NAME")
+
+    for generated in [f"{column}_PG", f"LAST_5_{column}_PG"]:
+        pd.testing.assert_series_equal(result[generated], expected[generated])
+
+
+def test_opponent_pg_matches_baseline(logs):
+    # Rows look up the history of another group, here the opponent of the game
+    _, team_logs = logs
+    team_logs = team_logs[team_logs.groupby("GAME_ID")["TEAM_NAME"].transform("size") == 2].reset_index(drop=True)
+    team_logs = team_logs.assign(OPPONENT=team_logs.groupby("GAME_ID")["TEAM_NAME"].transform(lambda names: names.iloc[::-1].values))
+
+    expected = baseline_generate_pg(team_logs.copy(), "DEF_RATING", "TEAM_NAME", "OPPONENT", 5, "OPP_")
+    result = generate_pg(team_logs.copy(), "DEF_RATING", "TEAM_NAME", "OPPONENT", 5, "OPP_")
+
+    for generated in ["OPP_DEF_RATING_PG", "OPP_LAST_5_DEF_RATING_PG"]:
+        pd.testing.assert_series_equal(result[generated], expected[generated])
+
+
+def test_b2b_matches_baseline(logs):
+    player_logs, _ = logs
+
+    expected = baseline_generate_b2b(player_logs.copy())
+    result = generate_b2b(player_logs.copy())
+
+    # Both back-to-back games and others are in the fixture
+    assert set(expected['B2B']) == {0, 1}
+    pd.testing.assert_series_equal(result['B2B'], expected['B2B'])
+
+
+def test_w_pct_matches_baseline(logs):
+    _, team_logs = logs
+
+    expected = baseline_generate_w_pct(team_logs.copy())
+    result = generate_w_pct(team_logs.copy())
+
+    for generated in ["W_PCT", "LAST_N_W_PCT"]:
+        pd.testing.assert_series_equal(result[generated], expected[generated])
+
+
+@pytest.mark.parametrize("season_type", ["Regular Season", "Playoffs"])
+@pytest.mark.parametrize("extension", [".csv", ".parquet"])
+def test_update_dataset_matches_full_build(tmp_path, monkeypatch, season_type, extension):
+    # A dataset built mid-season and updated with the rest of the season equals one built at the end of it
+    league = SyntheticLeague(players_per_team=3)
+    last_season, cut = "2020-21", {'date': None}
+
+    def transport(url, params):
+        response = league.response(url, params)
+
+        # Game logs of the last season requested without DateFrom end on the cut date
+        if cut['date'] is not None and params["Season"] == last_season and not params.get("DateFrom") and "gamelogs" in url:
+            result_set = response["resultSets"][0]
+            column = result_set["headers"].index("GAME_DATE")
+            result_set["rowSet"] = [row for row in result_set["rowSet"] if row[column] <= cut['date']]
+
+        return json.dumps(response).encode()
+
+    monkeypatch.setattr(get_data, "cache", None)
+    monkeypatch.setattr(get_data, "transport", transport)
+
+    full = str(tmp_path / f"full{extension}")
+    updated = str(tmp_path / f"updated{extension}")
+
+    generate_dataset(2, season_type, dst=full)
+
+    cut['date'] = "2020-04-28T00:00:00" if season_type == "Playoffs" else "2021-01-15T00:00:00"
+    generate_dataset(2, season_type, dst=updated)
+    cut['date'] = None
+
+    rows_before = get_dataset(updated).shape[0]
+    update_dataset(updated, season=last_season)
+
+    # New games are appended, so rows are compared in the same order, and as numbers when read from CSV
+    def sort_rows(df):
+        return set_dtypes(df).sort_values(["GAME_ID", "PLAYER_NAME"], kind="mergesort", ignore_index=True)
+
+    expected = sort_rows(get_dataset(full))
+    result = sort_rows(get_dataset(updated))
+
+    # Running totals continued from the saved state may differ from a full build in the last bit
+    assert rows_before < result.shape[0]
+    pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-9)
+
+    # Nothing new, nothing changes, and the feature store is refreshed all the same
+    store = FeatureStore(str(tmp_path / "feature_store.sqlite"))
+    update_dataset(updated, season=last_season, store=store)
+    pd.testing.assert_frame_equal(sort_rows(get_dataset(updated)), expected, check_exact=False, rtol=1e-9)
+
+    assert store.updated_at(season_type) is not None
+    assert store.lookup(season_type, expected['PLAYER_NAME'][0], expected['TEAM_NAME'][0], expected['MATCHUP'][0]) is not None
+
+
+def test_league_tables_recover_from_a_failed_request(monkeypatch):
+    # A request that failed once is made again by the next call instead of failing it too
+    league = SyntheticLeague(players_per_team=2)
+    failures = {"playergamelogs": 1, "leaguedashteamstats": 1}
+
+    def transport(url, params):
+        endpoint = url.rsplit("/", 1)[-1]
+
+        if failures.get(endpoint, 0) > 0:
+            failures[endpoint] -= 1
+            raise ConnectionError(f"{endpoint} dropped")
+
+        return league.transport(url, params)
+
+    monkeypatch.setattr(get_data, "cache", None)
+    monkeypatch.setattr(get_data, "transport", transport)
+
+    tables = LeagueTables("2020-21")
+    player = league.player_names[0]
+
+    with pytest.raises(ConnectionError):
+        tables.player_points("Regular Season", player)
+    assert tables.player_points("Regular Season", player).shape[0] > 0
+
+    with pytest.raises(ConnectionError):
+        tables.feature_tables("Regular Season")
+    players, teams = tables.feature_tables("Regular Season")
+    assert player in players.index and teams.shape[0] == 30
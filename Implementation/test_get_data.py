@@ -0,0 +1,24 @@
+import pytest
+
+import get_data
+
+
+@pytest.mark.parametrize("after", ["live", "replay"])
+def test_record_mode_restores_the_cache(tmp_path, monkeypatch, after):
+    # Recording turns the response cache off, leaving record mode turns the same cache back on
+    monkeypatch.setattr(get_data, "cache", get_data.cache)
+    monkeypatch.setattr(get_data, "transport", get_data.transport)
+    cache = get_data.configure_cache(path=str(tmp_path / "cache.sqlite"))
+
+    get_data.configure_transport("record", str(tmp_path / "fixtures"))
+    assert get_data.cache is None
+
+    # Recording again does not forget the cache from before the first record
+    get_data.configure_transport("record", str(tmp_path / "fixtures"))
+    get_data.configure_transport(after, str(tmp_path / "fixtures"))
+    assert get_data.cache is cache
+
+    # Switching between other modes leaves the cache alone
+    get_data.configure_cache(enabled=False)
+    get_data.configure_transport("live")
+    assert get_data.cache is None
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from inference import NumpyModel, export_model
+
+
+@pytest.fixture
+def numpy_model():
+    # 2 features -> 3 relu units -> 1 output, with statistics whose standard deviations are 2 and 0.5
+    return NumpyModel(
+        mean=[1.0, -1.0],
+        variance=[4.0, 0.25],
+        kernels=[[[1.0, -1.0, 0.5], [2.0, 1.0, -3.0]], [[1.0], [2.0], [-1.0]]],
+        biases=[[0.0, 0.5, -1.0], [3.0]],
+        activations=['relu', 'linear']
+    )
+
+
+def test_predict_matches_forward_pass_by_hand(numpy_model):
+    features = np.array([[3.0, -0.5], [1.0, -1.0], [-1.0, -2.0]], dtype=np.float32)
+
+    # Normalized rows: [1, 1], [0, 0], [-1, -2]
+    # Hidden before relu: [3, 0.5, -3.5], [0, 0.5, -1], [-5, -1.5, 4.5]
+    # Output: 3 + 1 * 3 + 2 * 0.5 = 7, 3 + 2 * 0.5 = 4, 3 - 1 * 4.5 = -1.5
+    expected = np.array([[7.0], [4.0], [-1.5]], dtype=np.float32)
+
+    np.testing.assert_allclose(numpy_model.predict(features), expected, rtol=1e-6)
+    np.testing.assert_allclose(numpy_model.predict(features, batch_size=2), expected, rtol=1e-6)
+
+
+def test_zero_variance_is_clamped():
+    # A constant feature is not divided by zero, like in the keras Normalization layer
+    model = NumpyModel([5.0], [0.0], [[[1.0]]], [[0.0]], ['linear'])
+
+    assert np.isfinite(model.predict([[5.0], [6.0]])).all()
+
+
+def test_save_load_round_trip(numpy_model, tmp_path):
+    dst = str(tmp_path / "model.npz")
+    numpy_model.save(dst)
+    loaded = NumpyModel.load(dst)
+
+    features = np.random.default_rng(0).normal(size=(100, 2)).astype(np.float32)
+
+    assert loaded.activations == numpy_model.activations
+    np.testing.assert_array_equal(loaded.predict(features), numpy_model.predict(features))
+
+
+def test_export_matches_keras(tmp_path):
+    pytest.importorskip("tensorflow")
+    from model import create_model
+
+    rng = np.random.default_rng(0)
+    train_x = rng.normal(3.0, 2.0, size=(256, 5)).astype(np.float32)
+    model = create_model(train_x)
+
+    dst = str(tmp_path / "model.npz")
+    export_model(model, dst)
+    numpy_model = NumpyModel.load(dst)
+    features = rng.normal(3.0, 2.0, size=(1024, 5)).astype(np.float32)
+
+    np.testing.assert_allclose(numpy_model.predict(features), model.predict(features, verbose=0), atol=1e-5)
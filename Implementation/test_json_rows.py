@@ -0,0 +1,74 @@
+import os
+import json
+import pandas as pd
+import pytest
+
+from json_rows import read_rows
+from replay import FixtureStore, record_synthetic
+from synthetic_data import SyntheticLeague
+
+
+@pytest.fixture(scope="module")
+def bodies(tmp_path_factory):
+    # Recorded responses with a list of result sets (game logs, team stats), the ones read_rows reads
+    store = FixtureStore(str(tmp_path_factory.mktemp("fixtures")))
+    record_synthetic(store, 1, league=SyntheticLeague(players_per_team=3))
+
+    ret = []
+    for name in sorted(os.listdir(store.directory)):
+        if name.endswith(".body"):
+            with open(os.path.join(store.directory, name), "rb") as f:
+                body = f.read()
+
+            if isinstance(json.loads(body)["resultSets"], list):
+                ret.append((name, body))
+
+    assert len(ret) > 0
+
+    return ret
+
+
+def expected_rows(body, columns, where=None):
+    result_set = json.loads(body)["resultSets"][0]
+    df = pd.DataFrame(result_set["rowSet"], columns=result_set["headers"])
+
+    for column, value in (where or {}).items():
+        df = df[df[column] == value]
+
+    return df[columns].reset_index(drop=True)
+
+
+def test_read_rows_matches_json_loads(bodies):
+    for name, body in bodies:
+        headers = json.loads(body)["resultSets"][0]["headers"]
+        columns = headers[::2]
+
+        result = pd.DataFrame(read_rows(body, columns), columns=columns)
+        pd.testing.assert_frame_equal(result, expected_rows(body, columns), obj=name)
+
+
+def test_read_rows_with_where_matches_json_loads(bodies):
+    for name, body in bodies:
+        result_set = json.loads(body)["resultSets"][0]
+        column = "PLAYER_NAME" if "PLAYER_NAME" in result_set["headers"] else "TEAM_NAME"
+        columns = [column, result_set["headers"][-1]]
+
+        for value in [result_set["rowSet"][0][result_set["headers"].index(column)], "Nobody"]:
+            where = {column: value}
+
+            result = pd.DataFrame(read_rows(body, columns, where), columns=columns)
+            pd.testing.assert_frame_equal(result, expected_rows(body, columns, where), obj=name, check_dtype=len(result) > 0)
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_read_rows_with_escaped_values(ensure_ascii):
+    # Matching values are found whether the response escapes them or not
+    rows = [["Nikola Jokić", 25], ["A/B \"C\"", 10], ["Nikola Jokic", 7]]
+    response = {"resource": "playergamelogs", "parameters": {"a": [1, {"rowSet": []}]},
+                "resultSets": [{"name": "Results", "headers": ["PLAYER_NAME", "PTS"], "rowSet": rows}, {"headers": ["X"], "rowSet": [[1]]}]}
+    body = json.dumps(response, indent=2, ensure_ascii=ensure_ascii).replace("/", "\\/").encode()
+
+    assert read_rows(body, ["PTS", "PLAYER_NAME"]) == [[points, name] for name, points in rows]
+    assert read_rows(body, ["PTS"], {"PLAYER_NAME": "Nikola Jokić"}) == [[25]]
+    assert read_rows(body, ["PTS"], {"PLAYER_NAME": "A/B \"C\""}) == [[10]]
+    assert read_rows(body, ["PTS"], {"PLAYER_NAME": "Nikola Jokic"}) == [[7]]
@@ -0,0 +1,62 @@
+import os
+import socket
+import numpy as np
+import pytest
+
+import get_data
+
+from generate_data import generate_dataset
+from synthetic_data import SyntheticLeague
+
+pytest.importorskip("tensorflow")
+
+from model import hypertune, train_models
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_distributed_hypertune_runs_and_resumes(tmp_path):
+    # Smoke test of a tiny search with a chief and two workers, then resumed with other data
+    pytest.importorskip("keras_tuner")
+
+    rng = np.random.default_rng(0)
+    train_x = rng.normal(size=(256, 4)).astype(np.float32)
+    train_y = train_x @ np.array([1.0, -2.0, 0.5, 3.0], dtype=np.float32)
+
+    directory = str(tmp_path)
+    result = hypertune(train_x, train_y, 2, directory, "smoke", free_port(), max_epochs=2, epochs=2)
+
+    assert result['workers'] == 2 and result['trials'] > 0
+
+    normalization = os.path.join(directory, "smoke_data", "normalization.npz")
+    with np.load(normalization) as saved:
+        mean = saved['mean'].copy()
+
+    # Nothing is left to search, and the data of the first trials is kept
+    resumed = hypertune(train_x * 10, train_y, 1, directory, "smoke", free_port(), max_epochs=2, epochs=2)
+
+    assert resumed['trials'] == 0
+    with np.load(normalization) as saved:
+        np.testing.assert_array_equal(saved['mean'], mean)
+
+
+def test_train_models_in_parallel(tmp_path, monkeypatch):
+    # Two models trained at once in spawned processes, which prepare the matrix in NBA_PREPARED_DIR
+    monkeypatch.setattr(get_data, "cache", None)
+    monkeypatch.setattr(get_data, "transport", SyntheticLeague(players_per_team=3).transport)
+    monkeypatch.setenv("NBA_PREPARED_DIR", str(tmp_path / "prepared"))
+
+    dataset = str(tmp_path / "nba_dataset_regularseason.csv")
+    generate_dataset(1, "Regular Season", dst=dataset)
+
+    jobs = [(dataset, str(tmp_path / f"nba_predictor_seed{seed}"), seed) for seed in [1, 2]]
+    results = train_models(jobs, workers=2, epochs=2)
+
+    assert [result['model'] for result in results] == [dst for _, dst, _ in jobs]
+    assert all(result['epochs'] == 2 and np.isfinite(result['mae']) for result in results)
+    assert all(os.path.exists(dst) for _, dst, _ in jobs)
+    assert len(os.listdir(tmp_path / "prepared")) > 0
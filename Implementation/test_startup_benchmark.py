@@ -0,0 +1,23 @@
+import importlib.util
+import pytest
+
+from startup_benchmark import measure
+
+
+# Only needed for training, tuning or plotting
+training_dependencies = {'tensorflow', 'keras_tuner', 'seaborn'}
+
+
+@pytest.mark.parametrize("module", ["main", "batch", "service"])
+def test_entry_point_does_not_import_training_dependencies(module):
+    # Imported in a fresh interpreter, like the app, the batch job and the service start
+    result = measure(module, repeat=1)
+
+    # Trying to import a training dependency that is not installed fails the import, anything else missing is skipped
+    if result['error'] is not None and "ModuleNotFoundError" in result['error']:
+        missing = result['error'].split("'")[1].split(".")[0]
+        if missing not in training_dependencies and importlib.util.find_spec(missing) is None:
+            pytest.skip(f"{missing} is not installed")
+
+    assert result['error'] is None
+    assert not training_dependencies.intersection(result['forbidden'])